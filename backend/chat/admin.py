@@ -1,25 +1,130 @@
+import uuid
+
 from django.contrib import admin
-from .models import Conversation, Message
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
+from django.utils.html import format_html_join
+
+from .models import Conversation, Message, PromptProfile, UsageCounter
 # Register your models here.
 
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the query planner's row estimate for large result sets.
+
+    On PostgreSQL the estimate comes from EXPLAIN and costs no table scan;
+    an exact COUNT(*) is only run when the estimate is small enough for the
+    count to be cheap. Other databases always use the exact count.
+    """
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        """Return the estimated or exact number of objects."""
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate > self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """
+    Inline formset that only loads one page of related objects.
+
+    The page is set by the inline from the request, so the change form
+    of a conversation with thousands of messages stays fast.
+    """
+    per_page = 20
+    page = 1
+
+    def get_queryset(self):
+        """Return the current page of the related objects."""
+        if not hasattr(self, '_page_queryset'):
+            start = (self.page - 1) * self.per_page
+            self._page_queryset = super().get_queryset()[start:start + self.per_page]
+        return self._page_queryset
+
+
 class MessageInline(admin.TabularInline):
     """
-    Inline for messages in the admin interface
+    Inline for messages in the admin interface, paginated with ?messages_page=N
     """
     model = Message
-    extra = 1
+    formset = PaginatedInlineFormSet
+    extra = 0
+    per_page = 20
+    page_param = 'messages_page'
+    # Re-parenting a message would leave its depth and the active branch stale
+    readonly_fields = ('parent',)
+    show_change_link = True
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        try:
+            page = max(int(request.GET.get(self.page_param, 1)), 1)
+        except ValueError:
+            page = 1
+        formset.per_page = self.per_page
+        formset.page = page
+        return formset
 
 class MessageAdmin(admin.ModelAdmin):
     """
     Admin configuration for Message model
     """
     list_display = ('id', 'conversation', 'role', 'content_preview', 'model', 'temperature', 'created_at')
-    list_filter = ('role', 'model', 'created_at', 'conversation')
-    search_fields = ('content', 'model')
-    
+    list_filter = ('role',)
+    list_select_related = ('conversation__user',)
+    search_fields = ('content',)
+    search_help_text = 'Search by message or conversation id, or by words in the content'
+    autocomplete_fields = ('conversation',)
+    readonly_fields = ('parent', 'depth')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search messages through indexed lookups only.
+
+        A UUID matches the message or its conversation by key. Other terms use
+        the full-text GIN index on PostgreSQL; on other databases (local
+        development) they fall back to the default content search.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            value = uuid.UUID(term)
+        except ValueError:
+            pass
+        else:
+            return queryset.filter(Q(pk=value) | Q(conversation_id=value)), False
+
+        if connections[queryset.db].vendor == 'postgresql':
+            # Must match the expression of the chat_message_content_fts index
+            return queryset.filter(RawSQL(
+                "to_tsvector('english', \"chat_message\".\"content\") @@ plainto_tsquery('english', %s)",
+                (term,),
+                output_field=BooleanField(),
+            )), False
+        return super().get_search_results(request, queryset, search_term)
+
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
-    
+
     content_preview.short_description = 'Content Preview'
 
 class ConversationAdmin(admin.ModelAdmin):
@@ -28,8 +133,78 @@ class ConversationAdmin(admin.ModelAdmin):
     """
     inlines = [MessageInline]
     list_display = ('title', 'user', 'created_at', 'updated_at')
-    list_filter = ('user',)
-    search_fields = ('title', 'user__username')
+    list_select_related = ('user',)
+    ordering = ('-updated_at',)
+    search_fields = ('title',)
+    search_help_text = 'Search by conversation id, exact username, or title prefix'
+    autocomplete_fields = ('user',)
+    raw_id_fields = ('prompt_profile',)
+    readonly_fields = ('active_message', 'message_pages')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search conversations through indexed lookups where possible.
+
+        A UUID matches the conversation by key and an existing username
+        matches that user's conversations; anything else is a title prefix.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(pk=uuid.UUID(term)), False
+        except ValueError:
+            pass
+
+        user_id = User.objects.filter(username=term).values_list('pk', flat=True).first()
+        if user_id is not None:
+            return queryset.filter(user_id=user_id), False
+        return queryset.filter(title__startswith=term), False
+
+    def message_pages(self, obj):
+        """
+        Links to the pages of the message inline.
+
+        The inline lists the messages of every branch, so they are counted
+        from the message table rather than from the sidebar index, which
+        only counts the active branch.
+        """
+        message_count = Message.objects.filter(conversation=obj).count() if obj.pk else 0
+        if not message_count:
+            return '-'
+        pages = range(1, (message_count - 1) // MessageInline.per_page + 2)
+        return format_html_join(
+            ' ', '<a href="?{}={}">{}</a>',
+            ((MessageInline.page_param, page, page) for page in pages)
+        )
+
+    message_pages.short_description = 'Message Pages'
+
+class PromptProfileAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for PromptProfile model
+    """
+    list_display = ('name', 'user', 'max_tokens', 'is_default', 'updated_at')
+    list_filter = ('is_default',)
+    list_select_related = ('user',)
+    search_fields = ('name', 'user__username')
+    autocomplete_fields = ('user',)
+
+class UsageCounterAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for UsageCounter model
+    """
+    list_display = ('user', 'model', 'window_start', 'requests', 'tokens')
+    list_filter = ('model',)
+    list_select_related = ('user',)
+    ordering = ('-window_start',)
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 admin.site.register(Conversation, ConversationAdmin)
 admin.site.register(Message, MessageAdmin)
+admin.site.register(PromptProfile, PromptProfileAdmin)
+admin.site.register(UsageCounter, UsageCounterAdmin)
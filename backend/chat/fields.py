@@ -0,0 +1,213 @@
+import threading
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+# Compressed values start with a byte naming their format
+ZSTD = b'\x01'  # zstd frame; frames compressed with a dictionary carry its id in their header
+ZLIB = b'\x02'  # zlib stream, written when zstandard is not installed
+
+_local = threading.local()
+
+
+class StoredText(str):
+    """
+    Empty text column value of a row whose content may be stored compressed.
+
+    Returned by CompressedTextField for empty database values, so reading
+    the compressed column can be deferred until the content is used.
+    """
+
+
+def get_compression_settings():
+    """
+    Get the MESSAGE_COMPRESSION setting with defaults applied.
+
+    Returns:
+        dict: The settings with 'enabled', 'min_size', 'level', 'dictionary'
+            and 'dictionaries' keys
+    """
+    return {
+        'enabled': False,
+        'min_size': 512,
+        'level': 3,
+        'dictionary': None,
+        'dictionaries': [],
+        **getattr(settings, 'MESSAGE_COMPRESSION', {}),
+    }
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(path):
+    """
+    Load a trained zstd dictionary from a file, once per process.
+
+    Args:
+        path (str): Path of the dictionary file
+
+    Returns:
+        ZstdCompressionDict: The dictionary
+    """
+    if zstandard is None:
+        raise ImproperlyConfigured("MESSAGE_COMPRESSION dictionaries require the zstandard package")
+    with open(path, 'rb') as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+def _get_dictionary(dict_id):
+    """Return the configured dictionary with an id, for reading."""
+    config = get_compression_settings()
+    for path in [config['dictionary'], *config['dictionaries']]:
+        if path and load_dictionary(path).dict_id() == dict_id:
+            return load_dictionary(path)
+    raise ImproperlyConfigured(
+        f"Message content was compressed with zstd dictionary {dict_id}, which is not configured "
+        "in MESSAGE_COMPRESSION"
+    )
+
+
+def _get_compressor(level, dictionary):
+    """Return this thread's zstd compressor for a level and dictionary; they are not thread-safe."""
+    cache = _local.__dict__.setdefault('codecs', {})
+    key = ('compressor', level, dictionary.dict_id() if dictionary else None)
+    if key not in cache:
+        cache[key] = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    return cache[key]
+
+
+def _get_decompressor(dictionary):
+    """Return this thread's zstd decompressor for a dictionary."""
+    cache = _local.__dict__.setdefault('codecs', {})
+    key = ('decompressor', dictionary.dict_id() if dictionary else None)
+    if key not in cache:
+        cache[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return cache[key]
+
+
+def encode_text(value, compress=None, method=None):
+    """
+    Compress text for the compressed column.
+
+    Text of at least `min_size` characters is compressed with zstd (with the
+    configured dictionary, if any), or with zlib when zstandard is not
+    installed. Text that is shorter, or does not get smaller, is not compressed.
+
+    Args:
+        value (str): The text
+        compress (bool): Whether to compress, defaults to the `enabled` setting
+        method (str): 'zstd' or 'zlib', defaults to zstd when it is installed
+
+    Returns:
+        bytes: The compressed text, or None to store it as plain text
+    """
+    config = get_compression_settings()
+    if compress is None:
+        compress = config['enabled']
+    if method is None:
+        method = 'zlib' if zstandard is None else 'zstd'
+    if not compress or len(value) < config['min_size']:
+        return None
+
+    data = value.encode()
+    if method == 'zlib':
+        compressed = ZLIB + zlib.compress(data, min(config['level'], 9))
+    else:
+        dictionary = load_dictionary(config['dictionary']) if config['dictionary'] else None
+        compressed = ZSTD + _get_compressor(config['level'], dictionary).compress(data)
+    return compressed if len(compressed) < len(data) else None
+
+
+def decode_text(data):
+    """
+    Decompress a value of the compressed column back into text.
+
+    Args:
+        data (bytes): The compressed text, as bytes or memoryview
+
+    Returns:
+        str: The text
+    """
+    data = bytes(data)
+    method, payload = data[:1], data[1:]
+    if method == ZLIB:
+        return zlib.decompress(payload).decode()
+    if method != ZSTD:
+        raise ValueError(f"Unknown compressed text format: {method!r}")
+    if zstandard is None:
+        raise ImproperlyConfigured("Reading zstd-compressed message content requires the zstandard package")
+    dict_id = zstandard.get_frame_parameters(payload).dict_id
+    dictionary = _get_dictionary(dict_id) if dict_id else None
+    return _get_decompressor(dictionary).decompress(payload).decode()
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Attribute that decodes a compressed value on first access.
+
+    The compressed bytes stay in their own attribute until the text is read,
+    so rows whose content is never used are never decompressed.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, StoredText):
+            data = getattr(instance, self.field.compressed_field)
+            value = '' if data is None else decode_text(data)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # Defining __set__ makes this a data descriptor, so __get__ runs even with the value in the instance dict
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField that can store large values compressed in a binary column.
+
+    Plain text is kept in this field's text column. Compressed text is kept
+    as bytes in the BinaryField named by `compressed_field`, declared after
+    this field, with an empty text column. Whether new values are compressed
+    is set by the MESSAGE_COMPRESSION setting; values of every format are
+    always read. Lookups and values()/values_list() see the text column, so
+    content searches do not match compressed rows. Saves with update_fields
+    and queryset updates must write both columns.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, compressed_field, **kwargs):
+        self.compressed_field = compressed_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['compressed_field'] = self.compressed_field
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value == '':
+            return StoredText(value)
+        return value
+
+    def pre_save(self, model_instance, add):
+        # A value that was never read keeps its compressed column as it is
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, StoredText):
+            return value
+        value = super().pre_save(model_instance, add)
+        compressed = None if value is None else encode_text(value)
+        # The compressed field is saved after this one, so it picks up the new bytes
+        setattr(model_instance, self.compressed_field, compressed)
+        return value if compressed is None else ''
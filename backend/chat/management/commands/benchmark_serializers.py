@@ -0,0 +1,134 @@
+import gzip
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from chat.models import ConversationIndex, Message
+from chat.renderers import ORJSONRenderer
+from chat.serializers import ConversationIndexSerializer, MessageSerializer
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+SAMPLE_CONTENT = """## Sorting a list in Python
+
+You can sort a list in place with `list.sort()` or get a new list with `sorted()`:
+
+```python
+numbers = [5, 2, 9, 1]
+numbers.sort()
+print(sorted(numbers, reverse=True))
+```
+
+- **`key`** lets you sort by a computed value
+- **`reverse=True`** sorts in descending order
+"""
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the fast serialization and rendering path against DRF's defaults.
+
+    Builds unsaved Message and ConversationIndex instances, checks that the
+    fast serializers and ORJSONRenderer produce exactly the same output as
+    plain ModelSerializers and JSONRenderer, then reports timings and the
+    compressed size of the payload.
+    """
+    help = "Benchmark hot serializers, JSON renderers and response compression"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help="Number of messages to serialize")
+        parser.add_argument('--repeat', type=int, default=20, help="Number of timed runs per variant")
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        repeat = options['repeat']
+        now = timezone.now()
+
+        messages = [
+            Message(
+                id=uuid.uuid4(),
+                parent_id=uuid.uuid4() if i else None,
+                role='user' if i % 2 == 0 else 'assistant',
+                content=SAMPLE_CONTENT,
+                created_at=now + timedelta(seconds=i),
+                model='gpt-4o-mini',
+                temperature=0.7,
+            )
+            for i in range(count)
+        ]
+        entries = [
+            ConversationIndex(
+                conversation_id=uuid.uuid4(),
+                title=f"Conversation {i}",
+                last_message_preview=SAMPLE_CONTENT[:100],
+                message_count=i,
+                created_at=now,
+                updated_at=now + timedelta(seconds=i),
+            )
+            for i in range(count)
+        ]
+
+        class BaselineMessageSerializer(serializers.ModelSerializer):
+            class Meta(MessageSerializer.Meta):
+                pass
+
+        class BaselineIndexSerializer(serializers.ModelSerializer):
+            id = serializers.UUIDField(source='conversation_id', read_only=True)
+
+            class Meta(ConversationIndexSerializer.Meta):
+                pass
+
+        for name, fast, baseline, objects in [
+            ('MessageSerializer', MessageSerializer, BaselineMessageSerializer, messages),
+            ('ConversationIndexSerializer', ConversationIndexSerializer, BaselineIndexSerializer, entries),
+        ]:
+            fast_data = fast(objects, many=True).data
+            if fast_data != baseline(objects, many=True).data:
+                raise CommandError(f"{name} output differs from the DRF baseline")
+            self.report(
+                f"{name} ({count} objects)",
+                self.measure(lambda: baseline(objects, many=True).data, repeat),
+                self.measure(lambda: fast(objects, many=True).data, repeat),
+            )
+
+        data = MessageSerializer(messages, many=True).data
+        rendered = JSONRenderer().render(data)
+        if ORJSONRenderer().render(data) != rendered:
+            raise CommandError("ORJSONRenderer output differs from JSONRenderer")
+        self.report(
+            f"JSON rendering ({len(rendered)} bytes)",
+            self.measure(lambda: JSONRenderer().render(data), repeat),
+            self.measure(lambda: ORJSONRenderer().render(data), repeat),
+        )
+
+        self.stdout.write(f"gzip: {len(gzip.compress(rendered))} bytes")
+        if brotli is not None:
+            self.stdout.write(f"brotli: {len(brotli.compress(rendered, quality=4))} bytes")
+        else:
+            self.stdout.write("brotli: not installed")
+
+    @staticmethod
+    def measure(func, repeat):
+        """Return the best wall-clock time of `repeat` calls to func, in milliseconds."""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    def report(self, label, baseline_ms, fast_ms):
+        """Write one benchmark line comparing the baseline and fast timings."""
+        self.stdout.write(
+            f"{label}: baseline {baseline_ms:.2f} ms, fast {fast_ms:.2f} ms "
+            f"({baseline_ms / fast_ms:.1f}x)"
+        )
@@ -0,0 +1,163 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.db.models import Case, F, Func, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.test.utils import override_settings
+
+from chat.fields import decode_text, encode_text, get_compression_settings, zstandard
+from chat.models import Message
+
+
+class Command(BaseCommand):
+    """
+    Convert stored message content to the current MESSAGE_COMPRESSION settings.
+
+    Rows are processed in primary-key batches, each rewritten with a single
+    UPDATE, and only rows whose stored form changes are written, so the
+    command can be interrupted and re-run. It can also store all content
+    uncompressed again, train a zstd dictionary from recent messages, and
+    benchmark the storage formats on a sample.
+    """
+    help = "Compress (or decompress) stored message content in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of messages per batch")
+        parser.add_argument('--limit', type=int, default=None, help="Maximum number of messages to process")
+        parser.add_argument('--decompress', action='store_true', help="Store all content uncompressed")
+        parser.add_argument('--train-dictionary', metavar='PATH', help="Train a zstd dictionary and write it to PATH")
+        parser.add_argument('--dict-size', type=int, default=112640, help="Size of a trained dictionary in bytes")
+        parser.add_argument('--benchmark', action='store_true', help="Report storage savings and overhead on a sample")
+        parser.add_argument('--sample', type=int, default=2000, help="Number of recent messages to train or benchmark on")
+
+    def handle(self, *args, **options):
+        if options['train_dictionary']:
+            self.train_dictionary(options['train_dictionary'], options['dict_size'], options['sample'])
+        elif options['benchmark']:
+            self.benchmark(options['sample'])
+        else:
+            self.convert(options['batch_size'], options['limit'], compress=not options['decompress'])
+
+    def convert(self, batch_size, limit, compress):
+        """Rewrite stored content in batches; only changed rows are written."""
+        processed = 0
+        updated = 0
+        last_pk = None
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            queryset = Message.objects.order_by('pk').only('id', 'content', 'content_compressed')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[:size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            processed += len(batch)
+
+            changes = {}
+            for message in batch:
+                stored = None if message.content_compressed is None else bytes(message.content_compressed)
+                compressed = encode_text(message.content, compress=compress)
+                if compressed != stored:
+                    changes[message.pk] = ('' if compressed else message.content, compressed)
+            if changes:
+                Message.objects.filter(pk__in=changes).update(
+                    content=Case(*[
+                        When(pk=pk, then=Value(text)) for pk, (text, _) in changes.items()
+                    ], output_field=models.TextField()),
+                    content_compressed=Case(*[
+                        When(pk=pk, then=Value(compressed, output_field=models.BinaryField()))
+                        for pk, (_, compressed) in changes.items()
+                    ], output_field=models.BinaryField()),
+                )
+                updated += len(changes)
+
+        self.stdout.write(self.style.SUCCESS(f"Rewrote {updated} of {processed} message(s)"))
+        if compress and not get_compression_settings()['enabled']:
+            self.stdout.write(self.style.WARNING(
+                "MESSAGE_COMPRESSION is not enabled, so new messages are still stored uncompressed"
+            ))
+
+    def get_sample(self, sample):
+        """Return the most recent messages, with their content loaded."""
+        return list(Message.objects.order_by('-created_at').only('id', 'content', 'content_compressed')[:sample])
+
+    def train_dictionary(self, path, dict_size, sample):
+        """Train a zstd dictionary on recent messages and write it to a file."""
+        if zstandard is None:
+            raise CommandError("Training a dictionary requires the zstandard package")
+        samples = [message.content.encode() for message in self.get_sample(sample)]
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, samples)
+        except zstandard.ZstdError as e:
+            raise CommandError(f"Could not train a dictionary on {len(samples)} message(s): {str(e)}")
+        with open(path, 'wb') as f:
+            f.write(dictionary.as_bytes())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote dictionary {dictionary.dict_id()} ({len(dictionary.as_bytes())} bytes) to {path}; "
+            "set it as MESSAGE_COMPRESSION['dictionary'] and re-run compress_messages"
+        ))
+
+    def get_disk_size(self, messages):
+        """
+        Return the size the content of messages currently takes on disk, on PostgreSQL.
+
+        pg_column_size() includes the compression PostgreSQL applies to large
+        values itself (TOAST), so savings are measured against real storage.
+        """
+        if connection.vendor != 'postgresql':
+            return None
+        return Message.objects.filter(pk__in=[message.pk for message in messages]).aggregate(
+            size=Sum(
+                Func(F('content'), function='pg_column_size')
+                + Coalesce(Func(F('content_compressed'), function='pg_column_size'), 0)
+            )
+        )['size']
+
+    def benchmark(self, sample):
+        """Report stored size and encode/decode time of each format on recent messages."""
+        messages = self.get_sample(sample)
+        if not messages:
+            raise CommandError("There are no messages to benchmark")
+        texts = [message.content for message in messages]
+        config = get_compression_settings()
+        raw_size = sum(len(text.encode()) for text in texts)
+        disk_size = self.get_disk_size(messages)
+        self.stdout.write(
+            f"{len(texts)} message(s), {raw_size} bytes uncompressed, "
+            f"min_size {config['min_size']}, level {config['level']}"
+        )
+        if disk_size is None:
+            baseline = raw_size
+            self.stdout.write("Savings are relative to the uncompressed size (on-disk sizes need PostgreSQL)")
+        else:
+            baseline = disk_size
+            self.stdout.write(f"Currently {disk_size} bytes on disk (pg_column_size); savings are relative to that")
+
+        variants = [('zlib', 'zlib', None)]
+        if zstandard is not None:
+            variants.insert(0, ('zstd', 'zstd', None))
+            if config['dictionary']:
+                variants.insert(1, ('zstd + dictionary', 'zstd', config['dictionary']))
+        else:
+            self.stdout.write("zstd: zstandard not installed")
+
+        for label, method, dictionary in variants:
+            with override_settings(MESSAGE_COMPRESSION={**config, 'dictionary': dictionary}):
+                start = time.perf_counter()
+                stored = [encode_text(text, compress=True, method=method) for text in texts]
+                encode_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                for data in stored:
+                    if data is not None:
+                        decode_text(data)
+                decode_ms = (time.perf_counter() - start) * 1000
+            stored_size = sum(
+                len(text.encode()) if data is None else len(data) for text, data in zip(texts, stored)
+            )
+            self.stdout.write(
+                f"{label}: {stored_size} bytes ({100 * (1 - stored_size / baseline):.1f}% saved), "
+                f"write {1000 * encode_ms / len(texts):.1f} us/message, "
+                f"read {1000 * decode_ms / len(texts):.1f} us/message"
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from chat.services.title_service import TitleService
+
+
+class Command(BaseCommand):
+    """
+    Generate titles for conversations that still have a placeholder title.
+
+    Intended to run periodically (e.g. from cron) when background title
+    generation is disabled, or as a sweep for conversations it missed.
+    """
+    help = "Generate titles for conversations that still have a placeholder title"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--llm', action='store_true', help="Ask the LLM for titles instead of the local heuristic")
+        parser.add_argument('--limit', type=int, default=None, help="Maximum number of conversations to process")
+
+    def handle(self, *args, **options):
+        service = TitleService(use_llm=options['llm'] or None)
+        updated = service.generate_pending(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Generated {updated} conversation title(s)"))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.services.quota_service import QuotaService
+
+
+class Command(BaseCommand):
+    """
+    Delete usage counters of quota windows that have ended.
+
+    Intended to run periodically (e.g. daily from cron); counters are only
+    needed while their window is current.
+    """
+    help = "Delete usage counters older than the given number of hours"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="Keep counters of windows started within this many hours")
+
+    def handle(self, *args, **options):
+        deleted = QuotaService.purge(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} usage counter(s)"))
@@ -0,0 +1,91 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+re_accepts_br = re.compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress large responses with Brotli or gzip, as negotiated by the client.
+    
+    Brotli is preferred when the client accepts it and the `brotli` package
+    is installed; otherwise Django's gzip handling is used. Responses below
+    RESPONSE_COMPRESSION_MIN_SIZE bytes are sent as-is, since compressing
+    them costs more CPU than it saves in transfer.
+    
+    Responses that may contain a CSRF token or session data use gzip even
+    when Brotli is accepted: Django pads gzip output with random bytes
+    against BREACH, and the Brotli format has no equivalent.
+    """
+    
+    @staticmethod
+    def may_contain_secrets(request, response):
+        """
+        Tell whether a response may carry a CSRF token or session-bound content.
+        
+        Args:
+            request: The HTTP request
+            response: The HTTP response
+            
+        Returns:
+            bool: True if the CSRF token or the session was used, or cookies are set
+        """
+        session = getattr(request, 'session', None)
+        return bool(
+            request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            or (session is not None and session.accessed)
+            or response.cookies
+        )
+    
+    def process_response(self, request, response):
+        """
+        Compress the response body if it is large enough and the client accepts it.
+        
+        Args:
+            request: The HTTP request
+            response: The HTTP response
+            
+        Returns:
+            HttpResponse: The (possibly compressed) response
+        """
+        if not response.streaming and len(response.content) < getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024):
+            return response
+        
+        # Streaming responses, clients without Brotli support and responses with secrets use gzip
+        ae = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if (
+            response.streaming or brotli is None or not re_accepts_br.search(ae)
+            or self.may_contain_secrets(request, response)
+        ):
+            return super().process_response(request, response)
+        
+        if response.has_header("Content-Encoding"):
+            return response
+        
+        patch_vary_headers(response, ("Accept-Encoding",))
+        
+        compressed_content = brotli.compress(
+            response.content,
+            quality=getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 4),
+        )
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+        
+        # A compressed representation may only carry a weak ETag
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        
+        return response
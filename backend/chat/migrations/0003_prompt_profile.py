@@ -0,0 +1,75 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0002_message_model_message_temperature"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="message",
+            options={"ordering": ["created_at", "id"]},
+        ),
+        migrations.CreateModel(
+            name="PromptProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "system_prompt",
+                    models.TextField(
+                        default="Always format your responses using Markdown syntax. Use code blocks with language specification for code, use headings, lists, bold, and other formatting where appropriate."
+                    ),
+                ),
+                ("max_tokens", models.PositiveIntegerField(default=500)),
+                ("stop", models.JSONField(blank=True, default=list)),
+                ("is_default", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prompt_profiles",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="prompt_profile",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="conversations",
+                to="chat.promptprofile",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="promptprofile",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_default", True)),
+                fields=("user",),
+                name="unique_default_prompt_profile",
+            ),
+        ),
+    ]
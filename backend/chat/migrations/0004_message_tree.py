@@ -0,0 +1,64 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_linear_paths(apps, schema_editor):
+    """Link existing messages into a single branch per conversation, in creation order."""
+    Conversation = apps.get_model("chat", "Conversation")
+    Message = apps.get_model("chat", "Message")
+    db_alias = schema_editor.connection.alias
+
+    for conversation in Conversation.objects.using(db_alias).only("id").iterator():
+        parent = None
+        messages = list(
+            Message.objects.using(db_alias)
+            .filter(conversation=conversation)
+            .only("id")
+            .order_by("created_at", "id")
+        )
+        for message in messages:
+            message.parent_id = parent.id if parent else None
+            message.path = (
+                f"{parent.path}/{message.id.hex}" if parent else message.id.hex
+            )
+            parent = message
+        Message.objects.using(db_alias).bulk_update(
+            messages, ["parent", "path"], batch_size=500
+        )
+        if parent is not None:
+            Conversation.objects.using(db_alias).filter(pk=conversation.pk).update(
+                active_path=parent.path
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0003_prompt_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="active_path",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="children",
+                to="chat.message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="path",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.RunPython(build_linear_paths, migrations.RunPython.noop),
+    ]
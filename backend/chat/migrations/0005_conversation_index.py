@@ -0,0 +1,95 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def build_conversation_index(apps, schema_editor):
+    """Create a sidebar index row for every existing conversation."""
+    Conversation = apps.get_model("chat", "Conversation")
+    ConversationIndex = apps.get_model("chat", "ConversationIndex")
+    Message = apps.get_model("chat", "Message")
+    db_alias = schema_editor.connection.alias
+
+    last_message = Message.objects.filter(conversation=OuterRef("pk")).order_by(
+        "-created_at", "-id"
+    )
+    conversations = Conversation.objects.using(db_alias).annotate(
+        message_count=Count("messages"),
+        last_message=Subquery(last_message.values("content")[:1]),
+    )
+    entries = []
+    for conversation in conversations.iterator(chunk_size=500):
+        entries.append(
+            ConversationIndex(
+                conversation_id=conversation.pk,
+                user_id=conversation.user_id,
+                title=conversation.title,
+                last_message_preview=" ".join(
+                    (conversation.last_message or "").split()
+                )[:100],
+                message_count=conversation.message_count,
+                created_at=conversation.created_at,
+                updated_at=conversation.updated_at,
+            )
+        )
+        if len(entries) >= 500:
+            ConversationIndex.objects.using(db_alias).bulk_create(entries)
+            entries = []
+    ConversationIndex.objects.using(db_alias).bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0004_message_tree"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="conversation",
+            options={},
+        ),
+        migrations.CreateModel(
+            name="ConversationIndex",
+            fields=[
+                (
+                    "conversation",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="index_entry",
+                        serialize=False,
+                        to="chat.conversation",
+                    ),
+                ),
+                ("title", models.CharField(blank=True, max_length=255, null=True)),
+                (
+                    "last_message_preview",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                ("message_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="conversation_index",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-updated_at"],
+                        name="chat_convindex_user_updated",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_conversation_index, migrations.RunPython.noop),
+    ]
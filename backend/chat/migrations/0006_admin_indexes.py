@@ -0,0 +1,76 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:35
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyIfPostgres(AddIndexConcurrently):
+    """
+    Build an index without blocking writes on PostgreSQL, and normally elsewhere.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+
+def create_content_search_index(apps, schema_editor):
+    """Create the full-text index used by the admin message search (PostgreSQL only)."""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS chat_message_content_fts ON chat_message "
+            "USING gin (to_tsvector('english', content))"
+        )
+
+
+def drop_content_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX CONCURRENTLY IF EXISTS chat_message_content_fts"
+        )
+
+
+class Migration(migrations.Migration):
+    # The tables can hold millions of rows, so PostgreSQL builds the indexes
+    # concurrently, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("chat", "0005_conversation_index"),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name="conversation",
+            index=models.Index(
+                fields=["updated_at", "id"], name="chat_conversation_updated_id"
+            ),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name="conversation",
+            index=models.Index(
+                fields=["title"],
+                name="chat_conversation_title_like",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name="message",
+            index=models.Index(
+                fields=["created_at", "id"], name="chat_message_created_id"
+            ),
+        ),
+        migrations.RunPython(create_content_search_index, drop_content_search_index),
+    ]
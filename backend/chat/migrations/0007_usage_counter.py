@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0006_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(blank=True, default="", max_length=50)),
+                ("window_start", models.DateTimeField()),
+                ("requests", models.PositiveIntegerField(default=0)),
+                ("tokens", models.PositiveIntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_counters",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="usagecounter",
+            constraint=models.UniqueConstraint(
+                fields=("user", "model", "window_start"), name="unique_usage_counter"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:05
+
+import chat.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0007_usage_counter"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="content",
+            field=chat.fields.CompressedTextField(
+                compressed_field="content_compressed"
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="content_compressed",
+            field=models.BinaryField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:57
+
+import chat.models
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0008_compressed_message_content"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="promptprofile",
+            name="max_tokens",
+            field=models.PositiveIntegerField(
+                default=500,
+                validators=[
+                    django.core.validators.MaxValueValidator(
+                        chat.models.get_max_tokens_limit
+                    )
+                ],
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:02
+
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def paths_to_depths(apps, schema_editor):
+    """Derive each message's depth and each conversation's active leaf from the materialized paths."""
+    Conversation = apps.get_model("chat", "Conversation")
+    Message = apps.get_model("chat", "Message")
+    db_alias = schema_editor.connection.alias
+
+    messages = []
+    for message in Message.objects.using(db_alias).only("id", "path").iterator():
+        message.depth = max(message.path.count("/"), 0)
+        messages.append(message)
+        if len(messages) >= 500:
+            Message.objects.using(db_alias).bulk_update(messages, ["depth"])
+            messages = []
+    Message.objects.using(db_alias).bulk_update(messages, ["depth"])
+
+    conversations = Conversation.objects.using(db_alias).exclude(active_path="")
+    for conversation in conversations.only("id", "active_path").iterator():
+        leaf = conversation.active_path.rpartition("/")[2]
+        Conversation.objects.using(db_alias).filter(pk=conversation.pk).update(
+            active_message_id=uuid.UUID(leaf)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0009_prompt_profile_max_tokens_limit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="depth",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="active_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+            ),
+        ),
+        migrations.RunPython(paths_to_depths, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="conversation",
+            name="active_path",
+        ),
+        migrations.RemoveField(
+            model_name="message",
+            name="path",
+        ),
+    ]
@@ -1,8 +1,78 @@
 import uuid
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
 
+from .fields import CompressedTextField
+
+
+def get_max_tokens_limit():
+    """
+    Get the largest max_tokens a prompt profile may set.
+    
+    Returns:
+        int: The PROMPT_MAX_TOKENS_LIMIT setting, 4096 by default
+    """
+    return getattr(settings, 'PROMPT_MAX_TOKENS_LIMIT', 4096)
+
+
+class PromptProfile(models.Model):
+    """
+    A reusable prompt configuration for generating assistant responses.
+    
+    Profiles belong to a user and can be attached to individual conversations.
+    A user may mark one profile as default, which is used for conversations
+    without an explicit profile.
+    
+    Attributes:
+        user (ForeignKey): Reference to the User who owns this profile
+        name (CharField): Display name of the profile
+        system_prompt (TextField): System message sent before the conversation history
+        max_tokens (PositiveIntegerField): Upper bound for the completion length, at most PROMPT_MAX_TOKENS_LIMIT
+        stop (JSONField): List of stop sequences passed to the model
+        is_default (BooleanField): Whether this is the user's default profile
+        created_at (DateTimeField): When the profile was created
+        updated_at (DateTimeField): When the profile was last updated
+    """
+    DEFAULT_SYSTEM_PROMPT = "Always format your responses using Markdown syntax. Use code blocks with language specification for code, use headings, lists, bold, and other formatting where appropriate."
+    DEFAULT_MAX_TOKENS = 500
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='prompt_profiles')
+    name = models.CharField(max_length=100)
+    system_prompt = models.TextField(default=DEFAULT_SYSTEM_PROMPT)
+    max_tokens = models.PositiveIntegerField(
+        default=DEFAULT_MAX_TOKENS, validators=[MaxValueValidator(get_max_tokens_limit)]
+    )
+    stop = models.JSONField(default=list, blank=True)
+    is_default = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        """Save the profile, making it the user's only default if is_default is set."""
+        with transaction.atomic():
+            if self.is_default:
+                PromptProfile.objects.filter(user=self.user, is_default=True).exclude(pk=self.pk).update(is_default=False)
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        """Return a string representation of the prompt profile."""
+        return f"{self.name} - {self.user.username}"
+
+    class Meta:
+        """Meta options for the PromptProfile model."""
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(is_default=True),
+                name='unique_default_prompt_profile',
+            ),
+        ]
+
 
 class Conversation(models.Model):
     """
@@ -15,15 +85,87 @@ class Conversation(models.Model):
         id (UUIDField): Unique identifier for the conversation
         user (ForeignKey): Reference to the User who owns this conversation
         title (CharField): Optional title for the conversation
+        prompt_profile (ForeignKey): Optional PromptProfile used for responses
+        active_message (ForeignKey): The message at the end of the active branch
         created_at (DateTimeField): When the conversation was created
         updated_at (DateTimeField): When the conversation was last updated
     """
+    # Placeholder titles that are replaced by generated ones after the first exchange
+    DEFAULT_TITLES = ('New Conversation', 'New conversation')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=255, blank=True, null=True)
+    prompt_profile = models.ForeignKey(
+        PromptProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='conversations'
+    )
+    active_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def get_active_messages(self, leaf_id=None):
+        """
+        Get the messages on the active branch, from the root to the leaf.
+        
+        The branch is resolved from the leaf with a recursive query, so this
+        is a single query regardless of how many branches the conversation has.
+        
+        Args:
+            leaf_id (UUID): Id of the last message of a branch to resolve
+                instead of the active one
+            
+        Returns:
+            list: The Message instances on the branch, in conversation order
+        """
+        return Message.get_branch(self.active_message_id if leaf_id is None else leaf_id)
+
+    def create_message(self, parent, **fields):
+        """
+        Create a message as a child of another message.
+        
+        The message shows up in the conversation's sidebar index row once its
+        branch is made the active one with set_active_message().
+        
+        Args:
+            parent (Message): The message replied to, or None for a root message
+            **fields: Field values for the new message
+            
+        Returns:
+            Message: The newly created message
+        """
+        message = Message(conversation=self, parent=parent, **fields)
+        message.depth = parent.depth + 1 if parent else 0
+        message.save()
+        return message
+
+    def set_active_message(self, message):
+        """
+        Make the branch ending at the given message the active one.
+        
+        The conversation's sidebar index row is updated in the same transaction.
+        
+        Args:
+            message (Message): The message at the end of the branch
+        """
+        self.active_message = message
+        with transaction.atomic():
+            self.save(update_fields=['active_message', 'updated_at'])
+            ConversationIndex.record_active_message(self, message)
+
+    def get_prompt_profile(self):
+        """
+        Resolve the prompt profile used for this conversation.
+        
+        Returns:
+            PromptProfile: The conversation's profile, the user's default profile,
+                or None to use the built-in defaults
+        """
+        if self.prompt_profile_id:
+            return self.prompt_profile
+        return PromptProfile.objects.filter(user_id=self.user_id, is_default=True).first()
+
     def generate_title(self, content):
         """
         Generate a title based on the first message content.
@@ -40,13 +182,30 @@ class Conversation(models.Model):
             return f"{title}..."
         return "New conversation"
 
+    @property
+    def has_default_title(self):
+        """Return True if the conversation still has a placeholder title."""
+        return not self.title or self.title in self.DEFAULT_TITLES
+
+    def save(self, *args, **kwargs):
+        """Save the conversation and keep its sidebar index row in sync."""
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'title' in update_fields:
+                ConversationIndex.sync(self)
+
     def __str__(self):
         """Return a string representation of the conversation."""
         return f"{self.title or 'Untitled'} - {self.user.username}"
 
     class Meta:
         """Meta options for the Conversation model."""
-        ordering = ['-updated_at']
+        indexes = [
+            # Admin changelist order and title prefix search
+            models.Index(fields=['updated_at', 'id'], name='chat_conversation_updated_id'),
+            models.Index(fields=['title'], opclasses=['varchar_pattern_ops'], name='chat_conversation_title_like'),
+        ]
 
 
 class Message(models.Model):
@@ -59,8 +218,12 @@ class Message(models.Model):
     Attributes:
         id (UUIDField): Unique identifier for the message
         conversation (ForeignKey): Reference to the Conversation this message belongs to
+        parent (ForeignKey): The message this one replies to, or None for a root message
+        depth (PositiveIntegerField): Number of messages above this one on its branch
         role (CharField): Either 'user' or 'assistant' indicating who sent the message
-        content (TextField): The actual text content of the message
+        content (CompressedTextField): The actual text content of the message, compressed
+            in storage when MESSAGE_COMPRESSION is enabled
+        content_compressed (BinaryField): The compressed content, or None when it is stored as plain text
         created_at (DateTimeField): When the message was created
         model (CharField): Optional name of the AI model used for assistant messages
         temperature (FloatField): Optional temperature setting used for generating the message
@@ -72,16 +235,201 @@ class Message(models.Model):
     ]
     
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    depth = models.PositiveIntegerField(default=0, editable=False)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
-    content = models.TextField()
+    content = CompressedTextField(compressed_field='content_compressed')
+    content_compressed = models.BinaryField(null=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     model = models.CharField(max_length=50, null=True, blank=True)  
     temperature = models.FloatField(null=True, blank=True)
     
+    @classmethod
+    def get_branch(cls, leaf_id):
+        """
+        Get the messages from the root of a branch down to its leaf.
+        
+        The ancestors are walked with a recursive query over parent ids, so
+        a branch costs one query whatever its length.
+        
+        Args:
+            leaf_id (UUID): Id of the last message of the branch, or None
+            
+        Returns:
+            list: The Message instances on the branch, in conversation order
+        """
+        if leaf_id is None:
+            return []
+        return list(cls._filter_recursive(
+            leaf_id,
+            # Each step joins a message to its parent, moving up towards the root
+            'SELECT m.{id}, m.{parent_id} FROM {table} m JOIN branch b ON m.{id} = b.{parent_id}',
+        ).order_by('depth'))
+
+    def get_latest_leaf(self):
+        """
+        Get the most recent message below this one, or this message itself.
+        
+        The newest message of a subtree always ends a branch, so it is the
+        leaf that a branch through this message continues to.
+        
+        Returns:
+            Message: The latest message in the subtree rooted at this message
+        """
+        return Message._filter_recursive(
+            self.pk,
+            # Each step joins the messages replying to those found so far
+            'SELECT m.{id}, m.{parent_id} FROM {table} m JOIN branch b ON m.{parent_id} = b.{id}',
+        ).order_by('-created_at', '-id').first()
+
+    @classmethod
+    def _filter_recursive(cls, start_id, step):
+        """Filter messages to those reached from start_id by repeating the step query."""
+        queryset = cls.objects.all()
+        connection = connections[queryset.db]
+        qn = connection.ops.quote_name
+        names = {
+            'table': qn(cls._meta.db_table),
+            'id': qn(cls._meta.pk.column),
+            'parent_id': qn(cls._meta.get_field('parent').column),
+        }
+        sql = (
+            'WITH RECURSIVE branch ({id}, {parent_id}) AS ('
+            'SELECT {id}, {parent_id} FROM {table} WHERE {id} = %s '
+            f'UNION ALL {step}'
+            ') SELECT {id} FROM branch'
+        ).format(**names)
+        start_id = cls._meta.pk.get_db_prep_value(cls._meta.pk.to_python(start_id), connection)
+        return queryset.filter(pk__in=RawSQL(sql, (start_id,)))
+
+    def save(self, *args, **kwargs):
+        """Save the message, deriving the depth of a new message from its parent."""
+        if self._state.adding and self.parent_id and not self.depth:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+
     def __str__(self):
         """Return a string representation of the message."""
         return f"{self.role}: {self.content[:50]}..."
     
     class Meta:
         """Meta options for the Message model."""
-        ordering = ['created_at']
\ No newline at end of file
+        # The id tie-breaker keeps history order stable so the prompt prefix sent upstream is identical across turns
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='chat_message_created_id'),
+        ]
+
+
+class ConversationIndex(models.Model):
+    """
+    Denormalized sidebar entry for a conversation.
+    
+    One row per conversation holds everything the conversation list needs,
+    so listing a user's conversations is a single indexed range scan that
+    never touches the message table. Rows are maintained transactionally
+    whenever a conversation is saved or its active branch changes.
+    
+    Attributes:
+        conversation (OneToOneField): The conversation this entry describes
+        user (ForeignKey): Reference to the User who owns the conversation
+        title (CharField): Copy of the conversation title
+        last_message_preview (CharField): Start of the last message on the active branch
+        message_count (PositiveIntegerField): Number of messages on the active branch
+        created_at (DateTimeField): When the conversation was created
+        updated_at (DateTimeField): When the conversation or its messages last changed
+    """
+    PREVIEW_LENGTH = 100
+
+    conversation = models.OneToOneField(
+        Conversation, on_delete=models.CASCADE, primary_key=True, related_name='index_entry'
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_index')
+    title = models.CharField(max_length=255, blank=True, null=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    @classmethod
+    def make_preview(cls, content):
+        """Return the collapsed, truncated preview of a message's content."""
+        return ' '.join(content.split())[:cls.PREVIEW_LENGTH]
+
+    @classmethod
+    def sync(cls, conversation):
+        """
+        Copy a conversation's title and timestamps into its index row.
+        
+        Args:
+            conversation (Conversation): The saved conversation
+        """
+        updated = cls.objects.filter(pk=conversation.pk).update(
+            title=conversation.title, updated_at=conversation.updated_at
+        )
+        if not updated:
+            cls.objects.create(
+                conversation=conversation,
+                user_id=conversation.user_id,
+                title=conversation.title,
+                created_at=conversation.created_at,
+                updated_at=conversation.updated_at,
+            )
+
+    @classmethod
+    def record_active_message(cls, conversation, message):
+        """
+        Show a conversation's new active branch in its index row.
+        
+        Args:
+            conversation (Conversation): The saved conversation
+            message (Message): The message at the end of the active branch
+        """
+        cls.objects.filter(pk=conversation.pk).update(
+            last_message_preview=cls.make_preview(message.content),
+            message_count=message.depth + 1,
+            updated_at=conversation.updated_at,
+        )
+
+    def __str__(self):
+        """Return a string representation of the index entry."""
+        return f"{self.title or 'Untitled'} ({self.message_count} messages)"
+
+    class Meta:
+        """Meta options for the ConversationIndex model."""
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='chat_convindex_user_updated'),
+        ]
+
+
+class UsageCounter(models.Model):
+    """
+    Usage of generation capacity by a user within one quota window.
+    
+    Counters are shared by all worker processes through the database and are
+    only ever changed with conditional UPDATE statements, so quota checks and
+    increments are atomic. A blank model holds the user's usage across all
+    models; other rows hold the usage of one model.
+    
+    Attributes:
+        user (ForeignKey): Reference to the User the usage belongs to
+        model (CharField): The model the usage is for, or '' for all models
+        window_start (DateTimeField): Start of the quota window
+        requests (PositiveIntegerField): Number of generations in the window
+        tokens (PositiveIntegerField): Number of prompt and completion tokens in the window
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_counters')
+    model = models.CharField(max_length=50, blank=True, default='')
+    window_start = models.DateTimeField()
+    requests = models.PositiveIntegerField(default=0)
+    tokens = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        """Return a string representation of the usage counter."""
+        return f"{self.user_id} {self.model or '*'} @ {self.window_start:%Y-%m-%d %H:%M}: {self.requests} requests, {self.tokens} tokens"
+
+    class Meta:
+        """Meta options for the UsageCounter model."""
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model', 'window_start'], name='unique_usage_counter'),
+        ]
@@ -1,6 +1,132 @@
-from rest_framework import serializers
+import inspect
+from collections.abc import Mapping
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
-from .models import Conversation, Message
+from django.db import models
+from django.db.models.fields.related_descriptors import ForeignKeyDeferredAttribute
+from django.db.models.query_utils import DeferredAttribute
+from .models import Conversation, ConversationIndex, Message, PromptProfile, get_max_tokens_limit
+
+class FastReadMixin:
+    """
+    Mixin for serializers on hot read paths.
+    
+    DRF's to_representation dispatches through get_attribute and
+    to_representation for every field of every instance. For serializers
+    made only of plain model fields, this mixin compiles the readable fields
+    once into (name, attribute, converter, direct) entries and builds each
+    representation directly from them. The output is identical to DRF's;
+    serializers with fields the mixin does not know fall back to DRF.
+    """
+    # Model attributes whose loaded value can be read from the instance dict
+    DIRECT_DESCRIPTORS = (DeferredAttribute, ForeignKeyDeferredAttribute)
+    
+    def _get_read_plan(self):
+        """
+        Compile the readable fields into a read plan, once per serializer instance.
+        
+        Returns:
+            list: (field name, attribute name, converter, direct) tuples, or None
+                if a field is not supported and DRF's path must be used
+        """
+        if not hasattr(self, '_read_plan'):
+            model = getattr(getattr(self, 'Meta', None), 'model', None)
+            plan = []
+            for field in self._readable_fields:
+                converter = self._get_converter(field)
+                if converter is False or len(field.source_attrs) != 1:
+                    plan = None
+                    break
+                attribute = field.source_attrs[0]
+                if isinstance(field, serializers.PrimaryKeyRelatedField):
+                    # Read the raw foreign key column instead of loading the related object
+                    attribute = f"{attribute}_id"
+                # Attributes with custom descriptors (e.g. compressed content) must go through getattr
+                direct = type(inspect.getattr_static(model, attribute, None)) in self.DIRECT_DESCRIPTORS
+                plan.append((field.field_name, attribute, converter, direct))
+            self._read_plan = plan
+        return self._read_plan
+    
+    @staticmethod
+    def _get_converter(field):
+        """
+        Get a fast converter equivalent to a field's to_representation.
+        
+        Args:
+            field: The serializer field
+            
+        Returns:
+            callable: The converter, None to use the value as-is, or False if
+                the field is not supported
+        """
+        if isinstance(field, serializers.UUIDField):
+            return str if field.uuid_format == 'hex_verbose' else field.to_representation
+        if type(field) is serializers.ChoiceField:
+            choices = field.choice_strings_to_values
+            return lambda value: value if value == '' else choices.get(str(value), value)
+        if isinstance(field, serializers.CharField):
+            return str
+        if isinstance(field, serializers.FloatField):
+            return float
+        if isinstance(field, serializers.IntegerField):
+            return int
+        if isinstance(field, serializers.DateTimeField):
+            return FastReadMixin._get_datetime_converter(field)
+        if type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None:
+            return None
+        return False
+    
+    @staticmethod
+    def _get_datetime_converter(field):
+        """
+        Get a converter for a DateTimeField that resolves the output timezone once.
+        
+        DRF looks up the current timezone for every value; a serializer
+        instance lives within one request, so it is resolved when the read
+        plan is compiled instead.
+        
+        Args:
+            field (DateTimeField): The serializer field
+            
+        Returns:
+            callable: The converter
+        """
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+        
+        def convert(value):
+            if isinstance(value, str) or value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+    
+    def to_representation(self, instance):
+        """
+        Convert an instance to its primitive representation.
+        
+        Args:
+            instance: The model instance to serialize
+            
+        Returns:
+            dict: The serialized data
+        """
+        plan = self._get_read_plan()
+        if plan is None or isinstance(instance, Mapping):
+            return super().to_representation(instance)
+        
+        ret = {}
+        loaded = instance.__dict__
+        for name, attribute, converter, direct in plan:
+            # Loaded model fields live in the instance dict; skip the descriptor lookup
+            value = loaded[attribute] if direct and attribute in loaded else getattr(instance, attribute)
+            ret[name] = value if value is None or converter is None else converter(value)
+        return ret
+
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -22,7 +148,7 @@ class UserSerializer(serializers.ModelSerializer):
             'password': {'write_only': True}
         }
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(FastReadMixin, serializers.ModelSerializer):
     """
     Serializer for the Message model.
     
@@ -31,6 +157,7 @@ class MessageSerializer(serializers.ModelSerializer):
     
     Attributes:
         id (UUID): The message's unique identifier
+        parent (UUID): The message this one replies to, or None for a root message
         role (str): Either 'user' or 'assistant'
         content (str): The text content of the message
         created_at (datetime): When the message was created
@@ -39,8 +166,73 @@ class MessageSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Message
-        fields = ['id', 'role', 'content', 'created_at', 'model', 'temperature']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'parent', 'role', 'content', 'created_at', 'model', 'temperature']
+        read_only_fields = ['id', 'parent', 'created_at']
+
+
+class GenerationTargetSerializer(serializers.Serializer):
+    """
+    Serializer for one model of a multi-model (fan-out) turn.
+    
+    Attributes:
+        model (str): The model name/deployment to generate with
+        temperature (float): Optional temperature, defaults to the request's
+    """
+    model = serializers.CharField(max_length=50)
+    temperature = serializers.FloatField(required=False, min_value=0.0, max_value=2.0)
+
+
+class PromptProfileSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the PromptProfile model.
+    
+    This serializer handles the conversion between PromptProfile model instances and JSON representations.
+    
+    Attributes:
+        id (int): The profile's unique identifier
+        name (str): The display name of the profile
+        system_prompt (str): The system message sent before the conversation history
+        max_tokens (int): Upper bound for the completion length, at most PROMPT_MAX_TOKENS_LIMIT
+        stop (list): Stop sequences passed to the model
+        is_default (bool): Whether this is the user's default profile
+    """
+    class Meta:
+        model = PromptProfile
+        fields = ['id', 'name', 'system_prompt', 'max_tokens', 'stop', 'is_default', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+        # The model's limit is read from settings on every call, see validate_max_tokens
+        extra_kwargs = {'max_tokens': {'min_value': 1, 'max_value': None}}
+
+    def validate_max_tokens(self, value):
+        """
+        Validate that max_tokens is within PROMPT_MAX_TOKENS_LIMIT.
+        
+        Args:
+            value: The submitted max_tokens
+            
+        Returns:
+            int: The validated max_tokens
+        """
+        limit = get_max_tokens_limit()
+        if value > limit:
+            raise serializers.ValidationError(f"Ensure this value is less than or equal to {limit}.")
+        return value
+
+    def validate_stop(self, value):
+        """
+        Validate that stop sequences are a list of at most four strings.
+        
+        Args:
+            value: The submitted stop sequences
+            
+        Returns:
+            list: The validated stop sequences
+        """
+        if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+            raise serializers.ValidationError("Stop sequences must be a list of non-empty strings.")
+        if len(value) > 4:
+            raise serializers.ValidationError("At most 4 stop sequences are supported.")
+        return value
 
 
 class ConversationSerializer(serializers.ModelSerializer):
@@ -55,15 +247,66 @@ class ConversationSerializer(serializers.ModelSerializer):
         title (str): The title of the conversation
         created_at (datetime): When the conversation was created
         updated_at (datetime): When the conversation was last updated
-        messages (list): A list of all messages in the conversation
+        prompt_profile (int): The id of the PromptProfile used for responses, if any
+        messages (list): The messages on the active branch, each with the ids of
+            its sibling branches under 'siblings'
     """
-    messages = MessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
+    prompt_profile = serializers.PrimaryKeyRelatedField(
+        queryset=PromptProfile.objects.all(), required=False, allow_null=True
+    )
     
     class Meta:
         model = Conversation
-        fields = ['id', 'title', 'created_at', 'updated_at', 'messages']
+        fields = ['id', 'title', 'prompt_profile', 'created_at', 'updated_at', 'messages']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def get_messages(self, obj):
+        """
+        Serialize the active branch of the conversation.
+        
+        Sibling ids for every message on the branch are fetched with one
+        extra query, so clients can offer branch switching.
+        
+        Args:
+            obj (Conversation): The conversation being serialized
+            
+        Returns:
+            list: The serialized messages on the active branch
+        """
+        messages = obj.get_active_messages()
+        if not messages:
+            return []
+        
+        parent_ids = {msg.parent_id for msg in messages if msg.parent_id}
+        siblings = {}
+        for parent_id, message_id in (
+            Message.objects
+            .filter(models.Q(parent_id__in=parent_ids) | models.Q(conversation=obj, parent__isnull=True))
+            .order_by('created_at', 'id')
+            .values_list('parent_id', 'id')
+        ):
+            siblings.setdefault(parent_id, []).append(message_id)
+        
+        data = MessageSerializer(messages, many=True).data
+        for item, msg in zip(data, messages):
+            item['siblings'] = [str(message_id) for message_id in siblings.get(msg.parent_id, [])]
+        return data
+
+    def validate_prompt_profile(self, value):
+        """
+        Validate that the prompt profile belongs to the current user.
+        
+        Args:
+            value (PromptProfile): The submitted profile
+            
+        Returns:
+            PromptProfile: The validated profile
+        """
+        if value is not None and value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError("Invalid prompt profile.")
+        return value
+
     def create(self, validated_data):
         """
         Create and return a new Conversation instance.
@@ -79,4 +322,27 @@ class ConversationSerializer(serializers.ModelSerializer):
         # Assign the current user to the conversation
         user = self.context['request'].user
         conversation = Conversation.objects.create(user=user, **validated_data)
-        return conversation
\ No newline at end of file
+        return conversation
+
+
+class ConversationIndexSerializer(FastReadMixin, serializers.ModelSerializer):
+    """
+    Serializer for the ConversationIndex model.
+    
+    This serializer renders the sidebar entry of a conversation without
+    touching the conversation or message tables.
+    
+    Attributes:
+        id (UUID): The conversation's unique identifier
+        title (str): The title of the conversation
+        last_message_preview (str): Start of the most recent message
+        message_count (int): Number of messages in the conversation
+        created_at (datetime): When the conversation was created
+        updated_at (datetime): When the conversation or its messages last changed
+    """
+    id = serializers.UUIDField(source='conversation_id', read_only=True)
+    
+    class Meta:
+        model = ConversationIndex
+        fields = ['id', 'title', 'last_message_preview', 'message_count', 'created_at', 'updated_at']
+        read_only_fields = fields
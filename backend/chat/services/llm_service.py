@@ -1,98 +1,178 @@
-import os
-import requests
-from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+
+from .prompt_service import PromptService
+from .providers import LLMServiceError, get_provider
+
+# Completion tokens per title line ("<number>. <up to six words>") of a batched title request
+TITLE_TOKENS_PER_SNIPPET = 16
+
 
 class LLMService:
     """
-    Service for interacting with Azure OpenAI Language Models.
+    Service for interacting with Language Models.
     
-    This service provides methods to communicate with Azure OpenAI API
-    for generating AI responses in the chat application. It handles
-    the API authentication, request formatting, and error handling.
+    This service formats prompts and sends them to the provider that serves
+    the requested model (Azure OpenAI, an OpenAI-compatible server, or a
+    local CPU model; see the LLM_PROVIDERS setting). It handles request
+    formatting and error handling.
     """
     
-    def __init__(self):
-        """
-        Initialize the LLM service with Azure OpenAI credentials.
-        
-        Retrieves API key, endpoint URL, and API version from environment
-        variables set in the application's configuration.
-        """
-        self.api_key = os.environ.get('AZURE_OPENAI_API_KEY')
-        self.base_url = os.environ.get('AZURE_OPENAI_ENDPOINT')
-        self.api_version = os.environ.get('AZURE_OPENAI_API_VERSION', '2024-10-21')
-        
-    def generate_response(self, conversation_history, deployment, temperature=0.7):
+    def generate_response(self, conversation_history, deployment, temperature=0.7, prompt_prefix=None):
         """
-        Generate a completion response using Azure OpenAI API.
+        Generate a completion response for a conversation.
         
-        This method sends the conversation messages to Azure OpenAI API
-        and returns the generated response. It includes a system message
-        to format responses using Markdown.
+        This method sends the conversation messages to the model's provider
+        and returns the generated response. The messages are preceded by
+        the prompt prefix (by default a system message asking for Markdown).
         
         Args:
-            messages (list): List of message dicts with 'role' and 'content' keys
-            model (str): The model name/deployment to use for generation
+            conversation_history (list): List of message dicts with 'role' and 'content' keys
+            deployment (str): The model to use for generation, as accepted by get_provider
             temperature (float): Controls randomness (0.0 to 1.0)
+            prompt_prefix (dict): Cached prefix from PromptService with 'messages',
+                'max_tokens' and 'stop' keys. Defaults to the built-in profile.
             
         Returns:
             str: The generated response text
-            
-        Raises:
-            Exception: If there's an error communicating with the API
         """
+        if prompt_prefix is None:
+            prompt_prefix = PromptService.get_prefix()
+        
+        # The prefix comes first and unchanged, so upstream prompt caching can reuse it
+        messages = list(prompt_prefix["messages"])
+        messages.extend([
+            {"role": msg["role"], "content": msg["content"]} 
+            for msg in conversation_history
+        ])
+        
         try:
-            # Construct the full API URL using the provided deployment
-            api_url = f"{self.base_url}openai/deployments/{deployment}/chat/completions?api-version={self.api_version}"
+            return self._chat_completion(
+                messages, deployment, temperature,
+                max_tokens=prompt_prefix["max_tokens"], stop=prompt_prefix["stop"]
+            )
+        except LLMServiceError as e:
+            # Log the error for debugging
+            print(f"Error from LLM provider: {str(e)}")
+            return "I'm sorry, I encountered an error generating a response."
+        except Exception as e:
+            # Log the exception
+            print(f"Exception in LLM service: {str(e)}")
+            return "I'm sorry, I encountered an unexpected error."
+
+    def generate_responses(self, conversation_history, targets, prompt_prefix=None):
+        """
+        Generate completions from several models for the same conversation.
+        
+        The upstream calls run concurrently against the same history and
+        prefix, so the total latency is that of the slowest model rather
+        than the sum. Each call fails independently, like generate_response.
+        
+        Args:
+            conversation_history (list): List of message dicts with 'role' and 'content' keys
+            targets (list): (deployment, temperature) tuples, one per completion
+            prompt_prefix (dict): Cached prefix from PromptService, shared by all calls
             
-            # Format the conversation history for the API
-            messages = [
-                {"role": "system", "content": "Always format your responses using Markdown syntax. Use code blocks with language specification for code, use headings, lists, bold, and other formatting where appropriate."}
+        Returns:
+            list: The generated response texts, in the order of targets
+        """
+        if prompt_prefix is None:
+            prompt_prefix = PromptService.get_prefix()
+        
+        if len(targets) == 1:
+            deployment, temperature = targets[0]
+            return [self.generate_response(conversation_history, deployment, temperature, prompt_prefix)]
+        
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = [
+                executor.submit(self.generate_response, conversation_history, deployment, temperature, prompt_prefix)
+                for deployment, temperature in targets
             ]
+            return [future.result() for future in futures]
+
+    def warm(self, deployment):
+        """
+        Warm the provider of a model for an upcoming completion, in the background.
+        
+        The provider starts a warm-up thread only when one is due, at most
+        once per its WARM_INTERVAL.
+        
+        Args:
+            deployment (str): The model that will be used, as accepted by get_provider
+        """
+        try:
+            provider, model = get_provider(deployment)
+        except Exception as e:
+            print(f"Exception in LLM service: {str(e)}")
+            return
+        provider.warm_soon(model)
+
+    def generate_titles(self, snippets, deployment, max_tokens=None):
+        """
+        Generate short titles for several conversations in a single API call.
+        
+        The opening messages are sent as a numbered list and the model is asked
+        to answer with one title per line, so a whole batch of pending
+        conversations costs one short, low-max_tokens request.
+        
+        Args:
+            snippets (list): Opening user messages, one per conversation
+            deployment (str): The model name/deployment to use for generation
+            max_tokens (int): Upper bound for the completion length, defaults to
+                TITLE_TOKENS_PER_SNIPPET per snippet
             
-            # Add the rest of conversation history
-            messages.extend([
-                {"role": msg["role"], "content": msg["content"]} 
-                for msg in conversation_history
-            ])
-            
-            # Azure OpenAI payload with temperature
-            payload = {
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": 500
-            }
+        Returns:
+            list: One title (str) or None per snippet, in the same order
             
-            # Azure OpenAI uses a different header for authentication
-            headers = {
-                "Content-Type": "application/json",
-                "api-key": self.api_key
-            }
+        Raises:
+            LLMServiceError: If the provider fails to produce a completion
+        """
+        numbered = "\n".join(
+            f"{i}. {' '.join(snippet.split())[:300]}"
+            for i, snippet in enumerate(snippets, start=1)
+        )
+        messages = [
+            {"role": "system", "content": "You write short titles for chat conversations. For each numbered message, reply with a line in the form '<number>. <title>' using at most six words. Do not use quotes or Markdown."},
+            {"role": "user", "content": numbered},
+        ]
+        if max_tokens is None:
+            max_tokens = TITLE_TOKENS_PER_SNIPPET * len(snippets)
+        content = self._chat_completion(messages, deployment, 0.2, max_tokens=max_tokens)
+        
+        titles = [None] * len(snippets)
+        for line in content.splitlines():
+            number, _, title = line.strip().partition('.')
+            if number.isdigit() and 0 < int(number) <= len(snippets):
+                title = title.strip().strip('"\'*#').strip()
+                if title:
+                    titles[int(number) - 1] = title[:255]
+        return titles
+
+    def _chat_completion(self, messages, deployment, temperature, max_tokens, stop=None):
+        """
+        Send a chat completion request to the provider serving the model.
+        
+        Args:
+            messages (list): Fully formatted messages, including any system message
+            deployment (str): The model to use for generation, as accepted by get_provider
+            temperature (float): Controls randomness (0.0 to 1.0)
+            max_tokens (int): Upper bound for the completion length
+            stop (list): Optional stop sequences
             
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=payload
-            )
+        Returns:
+            str: The generated text
             
-            if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
-            else:
-                # Log the error for debugging
-                print(f"Error from Azure OpenAI API: {response.status_code}, {response.text}")
-                return "I'm sorry, I encountered an error generating a response."
-                
-        except Exception as e:
-            # Log the exception
-            print(f"Exception in Azure OpenAI service: {str(e)}")
-            return "I'm sorry, I encountered an unexpected error."
+        Raises:
+            LLMServiceError: If the provider fails to produce a completion
+        """
+        provider, model = get_provider(deployment)
+        return provider.complete(messages, model, temperature, max_tokens, stop=stop)
 
     def mock_response(self, user_message):
         """
         Generate a mock response for testing without API calls.
         
         This method is useful for development and testing when
-        you don't want to make actual API calls to Azure OpenAI.
+        you don't want to make actual API calls to an LLM provider.
         
         Args:
             user_message (str): The user's message
@@ -0,0 +1,220 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import PromptProfile, get_max_tokens_limit
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+
+# Rough average for English text with GPT tokenizers, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+# Per-message overhead of the chat format (role and separators)
+TOKENS_PER_MESSAGE = 4
+
+PREFIX_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a history prepared while the user types stays cached, unless set in PREPARED_PROMPT_TIMEOUT
+PREPARED_HISTORY_TIMEOUT = 60
+
+
+def count_tokens(text):
+    """
+    Count the tokens in a piece of text.
+
+    Uses tiktoken when it is installed and falls back to a character-based
+    estimate otherwise.
+
+    Args:
+        text (str): The text to count
+
+    Returns:
+        int: The number of tokens
+    """
+    if tiktoken is not None:
+        return len(_encoding().encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_message_tokens(messages):
+    """
+    Count the tokens of a list of chat messages, including format overhead.
+
+    Args:
+        messages (list): List of message dicts with 'role' and 'content' keys
+
+    Returns:
+        int: The number of prompt tokens
+    """
+    return sum(TOKENS_PER_MESSAGE + count_tokens(msg["content"]) for msg in messages)
+
+
+_encoding_cache = {}
+
+
+def _encoding():
+    """Return the shared tiktoken encoding, loading it on first use."""
+    if 'encoding' not in _encoding_cache:
+        _encoding_cache['encoding'] = tiktoken.get_encoding('cl100k_base')
+    return _encoding_cache['encoding']
+
+
+class PromptService:
+    """
+    Service for building the prompt sent to the LLM.
+
+    The prompt is split into a prefix derived from the conversation's
+    PromptProfile (system prompt, max_tokens, stop sequences) and the
+    conversation history. The serialized prefix and its token count are
+    cached, keyed on the profile version, so they are built once per
+    profile edit instead of on every call. Keeping the prefix byte-identical
+    across turns also lets upstream prompt caching hit.
+
+    The formatted history of a branch can be prepared ahead of time, while
+    the user is typing. It is cached briefly under the id of the branch's
+    last message; messages never change once created, so an entry stays
+    valid until it expires.
+    """
+
+    @staticmethod
+    def get_prefix(profile=None):
+        """
+        Get the serialized prompt prefix for a profile.
+
+        Args:
+            profile (PromptProfile): The profile to use, or None for the built-in defaults
+
+        Returns:
+            dict: The prefix with 'messages', 'max_tokens', 'stop' and 'token_count' keys
+        """
+        if profile is None:
+            key = 'prompt-prefix:default'
+        else:
+            key = f'prompt-prefix:{profile.pk}:{profile.updated_at.timestamp()}'
+
+        prefix = cache.get(key)
+        if prefix is None:
+            prefix = PromptService.build_prefix(profile)
+            cache.set(key, prefix, PREFIX_CACHE_TIMEOUT)
+        return prefix
+
+    @staticmethod
+    def build_prefix(profile=None):
+        """
+        Serialize the prompt prefix for a profile without using the cache.
+
+        Args:
+            profile (PromptProfile): The profile to use, or None for the built-in defaults
+
+        Returns:
+            dict: The prefix with 'messages', 'max_tokens', 'stop' and 'token_count' keys
+        """
+        if profile is None:
+            system_prompt = PromptProfile.DEFAULT_SYSTEM_PROMPT
+            max_tokens = PromptProfile.DEFAULT_MAX_TOKENS
+            stop = []
+        else:
+            system_prompt = profile.system_prompt
+            # Profiles saved before the limit was lowered are capped as well
+            max_tokens = min(profile.max_tokens, get_max_tokens_limit())
+            stop = list(profile.stop or [])
+
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        return {
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "stop": stop,
+            "token_count": count_message_tokens(messages),
+        }
+
+    @staticmethod
+    def get_conversation_prefix(conversation):
+        """
+        Get the prompt prefix for a conversation's resolved profile.
+
+        Args:
+            conversation (Conversation): The conversation being answered
+
+        Returns:
+            dict: The cached prompt prefix
+        """
+        return PromptService.get_prefix(conversation.get_prompt_profile())
+
+    @staticmethod
+    def history_cache_key(conversation, leaf_id):
+        """
+        Get the cache key of a branch's prepared history.
+
+        Args:
+            conversation (Conversation): The conversation the branch belongs to
+            leaf_id (UUID): Id of the last message, or None for none
+
+        Returns:
+            str: The cache key
+        """
+        return f'prompt-history:{conversation.pk}:{leaf_id or "root"}'
+
+    @staticmethod
+    def build_history(conversation, leaf_id):
+        """
+        Format the branch ending at a message for the LLM, without using the cache.
+
+        Args:
+            conversation (Conversation): The conversation the branch belongs to
+            leaf_id (UUID): Id of the last message, or None for none
+
+        Returns:
+            dict: The history with 'messages' ({"role", "content"} dicts, from
+                the root) and 'token_count' keys
+        """
+        messages = [
+            {"role": msg.role, "content": msg.content}
+            for msg in conversation.get_active_messages(leaf_id)
+        ]
+        return {
+            "messages": messages,
+            "token_count": count_message_tokens(messages),
+        }
+
+    @staticmethod
+    def prepare_history(conversation, leaf_id):
+        """
+        Build a branch's history and cache it for an upcoming turn.
+
+        A history that is already prepared is kept, so repeated calls only
+        cost a cache lookup.
+
+        Args:
+            conversation (Conversation): The conversation the branch belongs to
+            leaf_id (UUID): Id of the last message, or None for none
+
+        Returns:
+            dict: The prepared history
+        """
+        key = PromptService.history_cache_key(conversation, leaf_id)
+        history = cache.get(key)
+        if history is None:
+            history = PromptService.build_history(conversation, leaf_id)
+            cache.set(key, history, getattr(settings, 'PREPARED_PROMPT_TIMEOUT', PREPARED_HISTORY_TIMEOUT))
+        return history
+
+    @staticmethod
+    def get_history(conversation, leaf_id):
+        """
+        Get a branch's history, prepared ahead of time if available.
+
+        Args:
+            conversation (Conversation): The conversation the branch belongs to
+            leaf_id (UUID): Id of the last message, or None for none
+
+        Returns:
+            dict: The history with 'messages' and 'token_count' keys; the
+                messages list is shared with the cache and must not be modified
+        """
+        history = cache.get(PromptService.history_cache_key(conversation, leaf_id))
+        if history is None:
+            history = PromptService.build_history(conversation, leaf_id)
+        return history
@@ -0,0 +1,79 @@
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .base import LLMProvider, LLMServiceError
+
+__all__ = ['LLMProvider', 'LLMServiceError', 'canonical_model', 'get_provider', 'resolve_model']
+
+
+MODEL_SEPARATOR = ':'
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def resolve_model(model):
+    """
+    Resolve a `model` value into a provider name and provider-specific model name.
+
+    Aliases from LLM_MODEL_ROUTES are applied first. A value of the form
+    '<provider>:<model>' selects that provider; any other value is a model
+    of LLM_DEFAULT_PROVIDER (by default, an Azure deployment name).
+
+    Args:
+        model (str): The model value sent by the client
+
+    Returns:
+        tuple: (provider name, provider-specific model name)
+    """
+    model = getattr(settings, 'LLM_MODEL_ROUTES', {}).get(model, model)
+    provider_name, separator, provider_model = model.partition(MODEL_SEPARATOR)
+    if separator and provider_name in getattr(settings, 'LLM_PROVIDERS', {}):
+        return provider_name, provider_model
+    return getattr(settings, 'LLM_DEFAULT_PROVIDER', 'azure'), model
+
+
+def canonical_model(model):
+    """
+    Get the canonical name of the model a `model` value is served by.
+
+    Values that reach the same model through an alias or an explicit
+    '<provider>:' prefix share one name: the bare model name for the
+    default provider, '<provider>:<model>' for the others.
+
+    Args:
+        model (str): The model value sent by the client
+
+    Returns:
+        str: The canonical model name
+    """
+    provider_name, provider_model = resolve_model(model)
+    if provider_name == getattr(settings, 'LLM_DEFAULT_PROVIDER', 'azure'):
+        return provider_model
+    return f"{provider_name}{MODEL_SEPARATOR}{provider_model}"
+
+
+def get_provider(model):
+    """
+    Get the provider instance serving a `model` value.
+
+    Providers are created once per process and shared between requests.
+
+    Args:
+        model (str): The model value sent by the client
+
+    Returns:
+        tuple: (LLMProvider instance, provider-specific model name)
+    """
+    provider_name, provider_model = resolve_model(model)
+    provider = _providers.get(provider_name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(provider_name)
+            if provider is None:
+                config = settings.LLM_PROVIDERS[provider_name]
+                provider = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+                _providers[provider_name] = provider
+    return provider, provider_model
@@ -0,0 +1,69 @@
+import os
+
+import requests
+
+from .base import LLMProvider, LLMServiceError
+
+
+class AzureOpenAIProvider(LLMProvider):
+    """
+    Provider for Azure OpenAI deployments.
+    
+    The model name is the Azure deployment name. Credentials default to the
+    AZURE_OPENAI_* environment variables and can be overridden in OPTIONS.
+    Requests share one HTTP session, so the TLS connection to Azure is reused.
+    """
+    
+    def __init__(self, **options):
+        """
+        Initialize the provider with Azure OpenAI credentials.
+        
+        Args:
+            api_key (str): API key, defaults to AZURE_OPENAI_API_KEY
+            endpoint (str): Endpoint URL, defaults to AZURE_OPENAI_ENDPOINT
+            api_version (str): API version, defaults to AZURE_OPENAI_API_VERSION
+            timeout (float): Request timeout in seconds
+        """
+        super().__init__(**options)
+        self.api_key = options.get('api_key') or os.environ.get('AZURE_OPENAI_API_KEY')
+        self.base_url = options.get('endpoint') or os.environ.get('AZURE_OPENAI_ENDPOINT')
+        self.api_version = options.get('api_version') or os.environ.get('AZURE_OPENAI_API_VERSION', '2024-10-21')
+        self.timeout = options.get('timeout', 60)
+        self.session = requests.Session()
+    
+    def complete(self, messages, model, temperature, max_tokens, stop=None):
+        # Construct the full API URL using the provided deployment
+        api_url = f"{self.base_url}openai/deployments/{model}/chat/completions?api-version={self.api_version}"
+        
+        # Azure OpenAI payload with temperature
+        payload = {
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if stop:
+            payload["stop"] = stop
+        
+        # Azure OpenAI uses a different header for authentication
+        headers = {
+            "Content-Type": "application/json",
+            "api-key": self.api_key
+        }
+        
+        response = self.session.post(api_url, headers=headers, json=payload, timeout=self.timeout)
+        
+        if response.status_code != 200:
+            raise LLMServiceError(f"{response.status_code}, {response.text}")
+        return response.json()["choices"][0]["message"]["content"]
+    
+    def warm(self, model):
+        # Any response leaves a pooled TLS connection behind in the session
+        if not self.base_url:
+            return
+        try:
+            self.session.head(self.base_url, timeout=5)
+        except requests.RequestException:
+            pass
+    
+    def close(self):
+        self.session.close()
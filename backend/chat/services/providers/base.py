@@ -0,0 +1,87 @@
+import threading
+import time
+
+
+class LLMServiceError(Exception):
+    """Raised when an LLM provider fails to produce a completion."""
+
+
+class LLMProvider:
+    """
+    Base class for LLM providers.
+    
+    A provider turns a list of chat messages into a completion for one of
+    the models it serves. Providers are created once per process from the
+    LLM_PROVIDERS setting and shared between requests, so they may keep
+    connections, sessions or worker pools open.
+    """
+    
+    # Minimum seconds between two warm-ups; pooled connections stay open in between
+    WARM_INTERVAL = 30
+    
+    def __init__(self, **options):
+        """
+        Initialize the provider.
+        
+        Args:
+            **options: The OPTIONS of the provider's LLM_PROVIDERS entry
+        """
+        self.options = options
+        self._warmed_at = None
+        self._warm_lock = threading.Lock()
+    
+    def complete(self, messages, model, temperature, max_tokens, stop=None):
+        """
+        Generate a completion.
+        
+        Args:
+            messages (list): Fully formatted messages, including any system message
+            model (str): The provider-specific model name
+            temperature (float): Controls randomness (0.0 to 1.0)
+            max_tokens (int): Upper bound for the completion length
+            stop (list): Optional stop sequences
+            
+        Returns:
+            str: The generated text
+            
+        Raises:
+            LLMServiceError: If the provider fails to produce a completion
+        """
+        raise NotImplementedError
+    
+    def warm(self, model):
+        """
+        Prepare to serve a model soon, e.g. by opening the upstream connection.
+        
+        Called in a background thread by warm_soon(), so the following
+        completion does not pay for connection setup. Must not raise. Does
+        nothing by default.
+        
+        Args:
+            model (str): The provider-specific model name
+        """
+    
+    def warm_soon(self, model):
+        """
+        Warm the provider for a model in a background thread.
+        
+        Called when a user starts typing. The thread is only started when a
+        warm-up is due, so frequent calls cost no more than a time check.
+        
+        Args:
+            model (str): The provider-specific model name
+        """
+        if self._warm_due():
+            threading.Thread(target=self.warm, args=(model,), daemon=True).start()
+    
+    def _warm_due(self):
+        """Return whether a warm-up is due, and if so record it as done now."""
+        with self._warm_lock:
+            now = time.monotonic()
+            if self._warmed_at is not None and now - self._warmed_at < self.WARM_INTERVAL:
+                return False
+            self._warmed_at = now
+            return True
+    
+    def close(self):
+        """Release the resources held by the provider."""
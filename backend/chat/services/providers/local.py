@@ -0,0 +1,144 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from .base import LLMProvider, LLMServiceError
+
+
+# Models loaded in this worker process, keyed by model name
+_loaded_models = {}
+
+
+def _load(name, spec):
+    """
+    Load a model into this worker process, if its backend needs loading.
+
+    Args:
+        name (str): The model name
+        spec (dict): The model's entry in the provider's `models` option
+
+    Returns:
+        The loaded model, or None for backends without a model file
+    """
+    if spec.get('backend', 'llama_cpp') != 'llama_cpp':
+        return None
+    if name not in _loaded_models:
+        from llama_cpp import Llama
+        _loaded_models[name] = Llama(
+            model_path=spec['path'],
+            n_ctx=spec.get('n_ctx', 4096),
+            n_threads=spec.get('n_threads'),
+            verbose=False,
+        )
+    return _loaded_models[name]
+
+
+def _generate(name, spec, messages, temperature, max_tokens, stop):
+    """
+    Generate a completion inside a pool worker process.
+
+    Models are loaded on first use and kept for the lifetime of the worker.
+
+    Args:
+        name (str): The model name
+        spec (dict): The model's entry in the provider's `models` option
+        messages (list): Fully formatted messages
+        temperature (float): Controls randomness (0.0 to 1.0)
+        max_tokens (int): Upper bound for the completion length
+        stop (list): Optional stop sequences
+
+    Returns:
+        str: The generated text
+    """
+    backend = spec.get('backend', 'llama_cpp')
+
+    if backend == 'echo':
+        # Deterministic model for offline development and tests
+        last_user = next((msg["content"] for msg in reversed(messages) if msg["role"] == "user"), "")
+        return f"Echo: {last_user}"[:max_tokens * 4]
+
+    if backend == 'llama_cpp':
+        result = _load(name, spec).create_chat_completion(
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stop=stop or None,
+        )
+        return result["choices"][0]["message"]["content"]
+
+    raise ValueError(f"Unknown local model backend: {backend}")
+
+
+class LocalCPUProvider(LLMProvider):
+    """
+    Provider running small models in-process on the CPU.
+
+    Generation runs in a pool of worker processes, so CPU-bound inference
+    never holds the GIL of the web workers and each worker keeps its models
+    loaded between requests. Models are declared in the `models` option,
+    e.g. {'tinyllama': {'backend': 'llama_cpp', 'path': '/models/tinyllama.gguf'}};
+    GGUF models need the optional `llama-cpp-python` package. The `echo`
+    backend needs no model file and answers deterministically, for offline use.
+    """
+
+    def __init__(self, **options):
+        """
+        Initialize the provider. The worker pool is started on first use.
+
+        Args:
+            models (dict): Model name to model spec
+            workers (int): Number of worker processes
+            timeout (float): Seconds to wait for a generation
+        """
+        super().__init__(**options)
+        self.models = options.get('models', {})
+        self.workers = options.get('workers', 1)
+        self.timeout = options.get('timeout', 120)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """Return the worker pool, starting it if needed."""
+        with self._lock:
+            if self._pool is None:
+                # Spawned workers do not inherit the web worker's threads and connections
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def complete(self, messages, model, temperature, max_tokens, stop=None):
+        spec = self.models.get(model)
+        if spec is None:
+            raise LLMServiceError(f"Unknown local model: {model}")
+
+        try:
+            future = self._get_pool().submit(_generate, model, spec, messages, temperature, max_tokens, stop)
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise LLMServiceError(f"Local model {model} timed out after {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next request
+            with self._lock:
+                self._pool = None
+            raise LLMServiceError(f"Local model {model} worker crashed")
+        except Exception as e:
+            raise LLMServiceError(f"Local model {model} failed: {str(e)}")
+
+    def warm(self, model):
+        # Start the worker pool and load the model without waiting for either
+        spec = self.models.get(model)
+        if spec is None:
+            return
+        try:
+            self._get_pool().submit(_load, model, spec)
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
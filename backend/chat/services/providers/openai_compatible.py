@@ -0,0 +1,63 @@
+import requests
+
+from .base import LLMProvider, LLMServiceError
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Provider for any server implementing the OpenAI chat completions API.
+    
+    Works with local inference servers such as llama.cpp's server, vLLM,
+    Ollama or LM Studio. The model name is sent as the request's `model`.
+    """
+    
+    def __init__(self, **options):
+        """
+        Initialize the provider.
+        
+        Args:
+            base_url (str): Base URL of the API, e.g. http://localhost:8080/v1/
+            api_key (str): Optional bearer token
+            timeout (float): Request timeout in seconds
+        """
+        super().__init__(**options)
+        self.base_url = options.get('base_url', 'http://localhost:8080/v1/')
+        if not self.base_url.endswith('/'):
+            self.base_url += '/'
+        self.api_key = options.get('api_key')
+        self.timeout = options.get('timeout', 120)
+        self.session = requests.Session()
+    
+    def complete(self, messages, model, temperature, max_tokens, stop=None):
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if stop:
+            payload["stop"] = stop
+        
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        response = self.session.post(
+            f"{self.base_url}chat/completions", headers=headers, json=payload, timeout=self.timeout
+        )
+        
+        if response.status_code != 200:
+            raise LLMServiceError(f"{response.status_code}, {response.text}")
+        return response.json()["choices"][0]["message"]["content"]
+    
+    def warm(self, model):
+        # Any response leaves a pooled TLS connection behind in the session
+        if not self.base_url:
+            return
+        try:
+            self.session.head(self.base_url, timeout=5)
+        except requests.RequestException:
+            pass
+    
+    def close(self):
+        self.session.close()
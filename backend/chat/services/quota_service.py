@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import UsageCounter
+from .providers import canonical_model
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a generation would exceed a user's usage quota.
+
+    Attributes:
+        retry_after (int): Seconds until the exceeded quota window resets
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaUnsatisfiable(Exception):
+    """
+    Raised when a single generation needs more tokens than a quota allows per window.
+
+    Waiting for the window to reset would not help, unlike QuotaExceeded.
+    """
+
+
+class QuotaService:
+    """
+    Service for enforcing per-user and per-model usage quotas.
+
+    Quotas limit the number of requests and tokens per fixed time window,
+    as configured in the USAGE_QUOTAS setting. Before a generation, its
+    prompt tokens plus max_tokens are reserved against every applicable
+    quota with conditional UPDATE statements on UsageCounter rows, so limits
+    hold across all worker processes. After the generation, the reservation
+    is settled to the tokens actually used.
+    """
+
+    @staticmethod
+    def get_quotas(model):
+        """
+        Get the quotas that apply to a generation with a model.
+
+        Per-model quotas and their counters are keyed by the canonical model
+        name, so an alias or a '<provider>:' prefix shares the quota of the
+        model it resolves to.
+
+        Args:
+            model (str): The model value of the generation
+
+        Returns:
+            list: (counter model, quota dict) tuples; '' is the all-models quota
+        """
+        config = getattr(settings, 'USAGE_QUOTAS', {})
+        quotas = []
+        if config.get('default'):
+            quotas.append(('', config['default']))
+        if model:
+            model = canonical_model(model)
+            model_quotas = {canonical_model(name): quota for name, quota in config.get('models', {}).items()}
+            if model_quotas.get(model):
+                quotas.append((model, model_quotas[model]))
+        return quotas
+
+    @staticmethod
+    def window_start(window, now=None):
+        """
+        Get the start of the fixed window containing a point in time.
+
+        Args:
+            window (int): Window length in seconds
+            now (datetime): The point in time, defaults to now
+
+        Returns:
+            datetime: The aware start of the window
+        """
+        now = now or timezone.now()
+        start = int(now.timestamp()) // window * window
+        return datetime.fromtimestamp(start, tz=dt_timezone.utc)
+
+    @classmethod
+    def reserve(cls, user, model, prompt_tokens, max_tokens):
+        """
+        Reserve one request and the tokens of a generation against all quotas.
+
+        Args:
+            user (User): The user generating
+            model (str): The model value of the generation
+            prompt_tokens (int): Tokens of the prompt that will be sent
+            max_tokens (int): Upper bound for the completion length
+
+        Returns:
+            dict: The reservation, to pass to settle() or release()
+
+        Raises:
+            QuotaUnsatisfiable: If the generation needs more tokens than a quota's limit
+            QuotaExceeded: If any quota has no room left; nothing is reserved
+        """
+        tokens = prompt_tokens + max_tokens
+        now = timezone.now()
+        counters = []
+        quotas = cls.get_quotas(model)
+
+        for counter_model, quota in quotas:
+            if quota.get('tokens') is not None and tokens > quota['tokens']:
+                raise QuotaUnsatisfiable(
+                    f"This message needs up to {tokens} tokens, more than the quota of {quota['tokens']} tokens "
+                    f"for {counter_model or 'all models'} allows. Lower the prompt profile's max_tokens "
+                    "or start a new conversation."
+                )
+
+        with transaction.atomic():
+            for counter_model, quota in quotas:
+                window = quota.get('window', 3600)
+                start = cls.window_start(window, now)
+                counter, _ = UsageCounter.objects.get_or_create(
+                    user=user, model=counter_model, window_start=start
+                )
+
+                # Check and increment in one statement, so concurrent workers cannot overshoot
+                filters = {}
+                if quota.get('requests') is not None:
+                    filters['requests__lt'] = quota['requests']
+                if quota.get('tokens') is not None:
+                    filters['tokens__lte'] = quota['tokens'] - tokens
+                updated = UsageCounter.objects.filter(pk=counter.pk, **filters).update(
+                    requests=F('requests') + 1, tokens=F('tokens') + tokens
+                )
+                if not updated:
+                    # Roll back the reservations already made against other quotas
+                    transaction.set_rollback(True)
+                    retry_after = int((start + timedelta(seconds=window) - now).total_seconds()) + 1
+                    raise QuotaExceeded(
+                        f"Usage quota exceeded for {counter_model or 'all models'}.", retry_after
+                    )
+                counters.append(counter.pk)
+
+        return {'counters': counters, 'tokens': tokens, 'prompt_tokens': prompt_tokens}
+
+    @staticmethod
+    def settle(reservation, completion_tokens):
+        """
+        Replace the reserved tokens with the tokens actually used.
+
+        Args:
+            reservation (dict): The reservation returned by reserve()
+            completion_tokens (int): Tokens of the generated completion
+        """
+        delta = reservation['prompt_tokens'] + completion_tokens - reservation['tokens']
+        if reservation['counters'] and delta:
+            UsageCounter.objects.filter(pk__in=reservation['counters']).update(tokens=F('tokens') + delta)
+        reservation['settled'] = True
+
+    @staticmethod
+    def release(reservation):
+        """
+        Give back a reservation for a generation that did not run.
+
+        Settled reservations are kept, since their generation did run.
+
+        Args:
+            reservation (dict): The reservation returned by reserve()
+        """
+        if reservation['counters'] and not reservation.get('settled'):
+            UsageCounter.objects.filter(pk__in=reservation['counters']).update(
+                requests=F('requests') - 1, tokens=F('tokens') - reservation['tokens']
+            )
+
+    @staticmethod
+    def purge(before=None):
+        """
+        Delete usage counters of windows that started before a point in time.
+
+        Args:
+            before (datetime): Cutoff, defaults to one day ago
+
+        Returns:
+            int: The number of deleted counters
+        """
+        before = before or timezone.now() - timedelta(days=1)
+        deleted, _ = UsageCounter.objects.filter(window_start__lt=before).delete()
+        return deleted
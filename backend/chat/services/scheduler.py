@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a generation waited too long for a free slot."""
+
+
+class _Ticket:
+    """A generation waiting for its slots."""
+    __slots__ = ('granted', 'slots')
+
+    def __init__(self, slots):
+        self.granted = False
+        self.slots = slots
+
+
+class FairScheduler:
+    """
+    Fair-share scheduler for generation capacity within one worker process.
+
+    At most `capacity` generations run at once. When all slots are busy,
+    generations wait in one FIFO queue per user, and freed slots are handed
+    out across users with smooth weighted round-robin: a user with weight 2
+    gets two slots for every one of a user with weight 1, interleaved rather
+    than in bursts, and a user with many queued generations cannot starve
+    the others. A turn that calls several models at once holds one slot per
+    call. Quotas shared between processes are enforced separately by
+    QuotaService; this only orders the work of the current process.
+    """
+
+    def __init__(self, capacity=4, timeout=60):
+        """
+        Initialize the scheduler.
+
+        Args:
+            capacity (int): Number of generations allowed to run at once
+            timeout (float): Seconds a generation may wait for a slot
+        """
+        self.capacity = capacity
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._running = 0
+        self._queues = {}
+        self._weights = {}
+        self._current = {}
+
+    def _next_user(self):
+        """Pick the user whose turn is next, by smooth weighted round-robin, without taking the turn."""
+        return max(self._queues, key=lambda user_id: self._current[user_id] + self._weights[user_id])
+
+    def _take_turn(self, user_id):
+        """Record that a user got their turn. Must hold the condition."""
+        for queued_user_id in self._queues:
+            self._current[queued_user_id] += self._weights[queued_user_id]
+        self._current[user_id] -= sum(self._weights.values())
+
+    def _dispatch(self):
+        """Hand free slots to queued generations. Must hold the condition."""
+        granted = False
+        while self._queues:
+            user_id = self._next_user()
+            queue = self._queues[user_id]
+            # The next generation keeps its turn until enough slots are free for all its calls
+            if self._running + queue[0].slots > self.capacity:
+                break
+            self._take_turn(user_id)
+            ticket = queue.popleft()
+            ticket.granted = True
+            self._running += ticket.slots
+            granted = True
+            if not queue:
+                self._remove_user(user_id)
+        if granted:
+            self._condition.notify_all()
+
+    def _remove_user(self, user_id):
+        """Forget a user whose queue is empty. Must hold the condition."""
+        del self._queues[user_id]
+        del self._weights[user_id]
+        del self._current[user_id]
+
+    def acquire(self, user_id, weight=1, slots=1):
+        """
+        Wait for generation slots.
+
+        Args:
+            user_id: The id of the user the generation is for
+            weight (int): The user's share of the capacity relative to other users
+            slots (int): Number of slots the generation needs, at most the capacity
+
+        Returns:
+            int: The number of slots acquired, to pass to release()
+
+        Raises:
+            SchedulerTimeout: If not enough slots were free within the timeout
+        """
+        slots = min(max(slots, 1), self.capacity)
+        with self._condition:
+            if self._running + slots <= self.capacity and not self._queues:
+                self._running += slots
+                return slots
+
+            ticket = _Ticket(slots)
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._current[user_id] = 0
+            self._queues[user_id].append(ticket)
+            self._weights[user_id] = max(weight, 1)
+
+            deadline = time.monotonic() + self.timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue = self._queues[user_id]
+                    queue.remove(ticket)
+                    if not queue:
+                        self._remove_user(user_id)
+                    # A generation waiting for several slots may have held back smaller ones
+                    self._dispatch()
+                    raise SchedulerTimeout(f"No generation slot free within {self.timeout}s")
+                self._condition.wait(remaining)
+            return slots
+
+    def release(self, slots=1):
+        """
+        Free generation slots and hand them to the next queued generations.
+
+        Args:
+            slots (int): The number of slots returned by acquire()
+        """
+        with self._condition:
+            self._running -= slots
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user_id, weight=1, slots=1):
+        """
+        Hold generation slots for the duration of a with block.
+
+        Args:
+            user_id: The id of the user the generation is for
+            weight (int): The user's share of the capacity relative to other users
+            slots (int): Number of slots the generation needs, e.g. one per model called
+
+        Raises:
+            SchedulerTimeout: If not enough slots were free within the timeout
+        """
+        slots = self.acquire(user_id, weight, slots)
+        try:
+            yield
+        finally:
+            self.release(slots)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Get the process-wide scheduler configured by the GENERATION_SCHEDULER setting.
+
+    Returns:
+        FairScheduler: The shared scheduler instance
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = getattr(settings, 'GENERATION_SCHEDULER', {})
+                _scheduler = FairScheduler(
+                    capacity=config.get('capacity', 4),
+                    timeout=config.get('timeout', 60),
+                )
+    return _scheduler
+
+
+def get_weight(user):
+    """
+    Get a user's scheduling weight; staff get the configured staff_weight.
+
+    Args:
+        user (User): The user generating
+
+    Returns:
+        int: The weight to pass to FairScheduler.slot
+    """
+    if user.is_staff:
+        return getattr(settings, 'GENERATION_SCHEDULER', {}).get('staff_weight', 1)
+    return 1
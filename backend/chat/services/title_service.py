@@ -0,0 +1,192 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, Exists, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from chat_backend.db_router import use_primary
+
+from ..fields import decode_text
+from ..models import Conversation, ConversationIndex, Message
+from .llm_service import TITLE_TOKENS_PER_SNIPPET, LLMService
+
+
+class TitleService:
+    """
+    Service for generating conversation titles off the request path.
+
+    Conversations that still carry a placeholder title after their first
+    exchange are picked up in batches. Titles come either from the cheap
+    local heuristic in Conversation.generate_title or from a single short
+    LLM call per batch, and are written back with one UPDATE statement.
+    """
+
+    _lock = threading.Lock()
+    _worker = None
+
+    def __init__(self, use_llm=None):
+        """
+        Initialize the title service.
+
+        Args:
+            use_llm (bool): Whether to ask the LLM for titles. Defaults to the
+                TITLE_GENERATION_USE_LLM setting.
+        """
+        if use_llm is None:
+            use_llm = getattr(settings, 'TITLE_GENERATION_USE_LLM', False)
+        self.use_llm = use_llm
+        self.model = getattr(settings, 'TITLE_GENERATION_MODEL', 'gpt-4o-mini')
+        self.batch_size = getattr(settings, 'TITLE_GENERATION_BATCH_SIZE', 20)
+
+    @staticmethod
+    def pending_conversations():
+        """
+        Get conversations that have had an exchange but still need a title.
+
+        Returns:
+            QuerySet: Pending conversations annotated with `first_message` and
+                `first_message_compressed`, the content of their earliest user message
+        """
+        first_message = Message.objects.filter(
+            conversation=OuterRef('pk'), role='user'
+        ).order_by('created_at')
+        has_reply = Message.objects.filter(conversation=OuterRef('pk'), role='assistant')
+
+        return (
+            Conversation.objects
+            .filter(Q(title__isnull=True) | Q(title__in=Conversation.DEFAULT_TITLES))
+            .filter(Exists(has_reply))
+            .annotate(
+                first_message=Subquery(first_message.values('content')[:1]),
+                first_message_compressed=Subquery(first_message.values('content_compressed')[:1]),
+            )
+        )
+
+    def generate_pending(self, limit=None):
+        """
+        Generate and store titles for pending conversations in batches.
+
+        Args:
+            limit (int): Maximum number of conversations to process, or None for all
+
+        Returns:
+            int: The number of conversations that received a title
+        """
+        updated = 0
+        processed = 0
+        last = None
+        while limit is None or processed < limit:
+            size = self.batch_size if limit is None else min(self.batch_size, limit - processed)
+            queryset = self.pending_conversations().order_by('created_at', 'id')
+            if last is not None:
+                # Keyset pagination, so conversations that keep their placeholder are not refetched
+                queryset = queryset.filter(
+                    Q(created_at__gt=last.created_at) | Q(created_at=last.created_at, id__gt=last.id)
+                )
+            batch = list(queryset.only('id', 'title', 'created_at')[:size])
+            if not batch:
+                break
+
+            updated += self.save_titles(self.generate_titles(batch))
+            processed += len(batch)
+            last = batch[-1]
+        return updated
+
+    def generate_titles(self, conversations):
+        """
+        Build titles for a batch of conversations.
+
+        Args:
+            conversations (list): Conversations annotated with `first_message`
+
+        Returns:
+            dict: Mapping of conversation id to generated title
+        """
+        for conversation in conversations:
+            # Compressed content is annotated separately from the (then empty) text column
+            if conversation.first_message_compressed is not None:
+                conversation.first_message = decode_text(conversation.first_message_compressed)
+        conversations = [c for c in conversations if c.first_message]
+        titles = [None] * len(conversations)
+
+        if self.use_llm and conversations:
+            try:
+                # One title line per conversation, so the answer is not cut off in large batches
+                titles = LLMService().generate_titles(
+                    [c.first_message for c in conversations], self.model,
+                    max_tokens=TITLE_TOKENS_PER_SNIPPET * len(conversations),
+                )
+            except Exception as e:
+                # Fall back to the local heuristic for the whole batch
+                print(f"Exception generating conversation titles: {str(e)}")
+
+        return {
+            conversation.pk: title or conversation.generate_title(' '.join(conversation.first_message.split()))
+            for conversation, title in zip(conversations, titles)
+        }
+
+    @staticmethod
+    def save_titles(titles):
+        """
+        Write generated titles back with a single UPDATE statement.
+
+        Only conversations that still have a placeholder title are updated,
+        so a rename made by the user while generation ran is never overwritten.
+        Their sidebar index rows are refreshed in the same transaction.
+
+        Args:
+            titles (dict): Mapping of conversation id to title
+
+        Returns:
+            int: The number of updated conversations
+        """
+        if not titles:
+            return 0
+        with transaction.atomic():
+            updated = (
+                Conversation.objects
+                .filter(pk__in=titles.keys())
+                .filter(Q(title__isnull=True) | Q(title__in=Conversation.DEFAULT_TITLES))
+                .update(title=Case(
+                    *[When(pk=pk, then=Value(title)) for pk, title in titles.items()],
+                    default='title',
+                ))
+            )
+            ConversationIndex.objects.filter(pk__in=titles.keys()).update(
+                title=Subquery(Conversation.objects.filter(pk=OuterRef('pk')).values('title')[:1]),
+                updated_at=timezone.now(),
+            )
+        return updated
+
+    @classmethod
+    def schedule(cls):
+        """
+        Start a background title generation run if none is in progress.
+
+        The worker waits TITLE_GENERATION_DELAY seconds before running, so
+        first exchanges that finish around the same time share one batch.
+        This returns immediately and adds no latency to the caller.
+        """
+        if not getattr(settings, 'TITLE_GENERATION_BACKGROUND', True):
+            return
+        with cls._lock:
+            if cls._worker is not None and cls._worker.is_alive():
+                return
+            cls._worker = threading.Thread(target=cls._run_worker, daemon=True)
+            cls._worker.start()
+
+    @classmethod
+    def _run_worker(cls):
+        """Run title generation in a background thread with its own DB connection."""
+        time.sleep(getattr(settings, 'TITLE_GENERATION_DELAY', 2.0))
+        close_old_connections()
+        try:
+            # Replicas may not have the new conversations yet, and the request's pin does not carry over to threads
+            with use_primary():
+                cls().generate_pending()
+        except Exception as e:
+            print(f"Exception in background title generation: {str(e)}")
+        finally:
+            connection.close()
@@ -1,3 +1,878 @@
-from django.test import TestCase
+import gzip
+import threading
+import time
+import uuid
+import warnings
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from chat_backend.db_router import use_primary
+
+from .admin import ConversationAdmin, MessageInline
+from .fields import StoredText
+from .middleware import CompressionMiddleware
+from .models import Conversation, ConversationIndex, Message, UsageCounter
+from .renderers import ORJSONRenderer
+from .serializers import ConversationIndexSerializer, MessageSerializer
+from .services.llm_service import LLMService
+from .services.prompt_service import PromptService
+from .services import providers
+from .services.providers import LLMServiceError, get_provider, resolve_model
+from .services.providers.azure import AzureOpenAIProvider
+from .services.providers.local import LocalCPUProvider
+from .services.quota_service import QuotaExceeded, QuotaService
+from .services.scheduler import FairScheduler, SchedulerTimeout
+from .services.title_service import TitleService
+
+
+class PrimaryTestCase(TestCase):
+    """
+    Base test case that reads from the primary database.
+
+    With the read replica settings profile, reads outside of write requests
+    would go to the replica test databases, which are never written to.
+    Routing itself is tested in chat_backend.
+    """
+
+    def setUp(self):
+        super().setUp()
+        primary = use_primary()
+        primary.__enter__()
+        self.addCleanup(primary.__exit__, None, None, None)
+
+
+@override_settings(TITLE_GENERATION_BACKGROUND=False)
+class APITestCase(PrimaryTestCase):
+    """
+    Base test case with an authenticated API client and a stubbed LLM.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch.object(LLMService, '_chat_completion', return_value='Hello!')
+        self.chat_completion = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_conversation(self, **data):
+        """Create a conversation through the API and return its id."""
+        response = self.client.post('/api/conversations/', {'title': 'New Conversation', **data}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def add_message(self, conversation_id, content='Hi', **data):
+        """Post a user message to a conversation and return the response."""
+        return self.client.post(
+            f'/api/conversations/{conversation_id}/add_message/',
+            {'role': 'user', 'content': content, **data},
+            format='json',
+        )
+
+
+@override_settings(PROMPT_MAX_TOKENS_LIMIT=1000)
+class PromptProfileLimitTests(APITestCase):
+    """
+    Tests for the max_tokens limit of prompt profiles.
+    """
+
+    def test_max_tokens_above_limit_is_rejected(self):
+        response = self.client.post('/api/prompt-profiles/', {'name': 'Long', 'max_tokens': 1001}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('max_tokens', response.data)
+
+    def test_max_tokens_below_one_is_rejected(self):
+        for max_tokens in (0, -1):
+            response = self.client.post(
+                '/api/prompt-profiles/', {'name': 'Empty', 'max_tokens': max_tokens}, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('max_tokens', response.data)
+
+    def test_max_tokens_at_limit_is_accepted(self):
+        response = self.client.post('/api/prompt-profiles/', {'name': 'Long', 'max_tokens': 1000}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(USAGE_QUOTAS={'default': {'requests': 10, 'tokens': 500, 'window': 3600}})
+    def test_turn_larger_than_quota_is_a_bad_request(self):
+        profile = self.client.post('/api/prompt-profiles/', {'name': 'Long', 'max_tokens': 1000}, format='json')
+        conversation_id = self.create_conversation(prompt_profile=profile.data['id'])
+
+        response = self.add_message(conversation_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Retry-After', response)
+        self.assertFalse(UsageCounter.objects.filter(requests__gt=0).exists())
+        self.chat_completion.assert_not_called()
+
+
+class ConversationIndexTests(APITestCase):
+    """
+    Tests for keeping the sidebar index in sync with the active branch.
+    """
+
+    def test_index_follows_branch_switches(self):
+        conversation_id = self.create_conversation()
+        first = self.add_message(conversation_id, 'First')
+        self.add_message(conversation_id, 'Second')
+
+        self.chat_completion.return_value = 'Edited answer'
+        self.client.post(
+            f'/api/conversations/{conversation_id}/edit_message/',
+            {'message_id': first.data['user_message']['id'], 'content': 'Edited'},
+            format='json',
+        )
+        entry = ConversationIndex.objects.get(pk=conversation_id)
+        self.assertEqual((entry.last_message_preview, entry.message_count), ('Edited answer', 2))
+
+        listing = self.client.get('/api/conversations/')
+        self.client.post(
+            f'/api/conversations/{conversation_id}/switch_branch/',
+            {'message_id': first.data['user_message']['id']},
+            format='json',
+        )
+        entry.refresh_from_db()
+        self.assertEqual((entry.last_message_preview, entry.message_count), ('Hello!', 4))
+        self.assertEqual(Message.objects.filter(conversation_id=conversation_id).count(), 6)
+
+        response = self.client.get('/api/conversations/', HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_modified_since_accepts_naive_and_aware_times(self):
+        conversation_id = self.create_conversation()
+        updated_at = ConversationIndex.objects.get(pk=conversation_id).updated_at
+        before = (updated_at - timedelta(seconds=1)).replace(tzinfo=None).isoformat()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.client.get('/api/conversations/', {'modified_since': before})
+        self.assertEqual([entry['id'] for entry in response.data], [conversation_id])
+
+        response = self.client.get('/api/conversations/', {'modified_since': updated_at.isoformat()})
+        self.assertEqual(response.data, [])
+
+        response = self.client.get('/api/conversations/', {'modified_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConversationAdminTests(PrimaryTestCase):
+    """
+    Tests for the conversation admin.
+    """
+
+    def test_message_pages_cover_every_branch(self):
+        user = User.objects.create_user('alice', password='password')
+        conversation = Conversation.objects.create(user=user, title='Branches')
+        model_admin = ConversationAdmin(Conversation, admin.site)
+        self.assertEqual(model_admin.message_pages(conversation), '-')
+
+        root = conversation.create_message(None, role='user', content='Question')
+        for i in range(MessageInline.per_page):
+            conversation.set_active_message(conversation.create_message(root, role='assistant', content=f'Answer {i}'))
+
+        self.assertEqual(ConversationIndex.objects.get(pk=conversation.pk).message_count, 2)
+        self.assertEqual(model_admin.message_pages(conversation).count('<a '), 2)
+
+
+class MessageTreeTests(APITestCase):
+    """
+    Tests for branching conversations.
+    """
+
+    def test_regenerate_adds_a_sibling_answer(self):
+        conversation_id = self.create_conversation()
+        self.add_message(conversation_id, 'First')
+        second = self.add_message(conversation_id, 'Second')
+        answer_id = second.data['assistant_message']['id']
+
+        self.chat_completion.return_value = 'Regenerated'
+        response = self.client.post(
+            f'/api/conversations/{conversation_id}/regenerate/', {'model': 'gpt-4o'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        regenerated = Message.objects.get(pk=response.data['assistant_message']['id'])
+        self.assertEqual((regenerated.content, regenerated.model), ('Regenerated', 'gpt-4o'))
+        self.assertEqual(str(regenerated.parent_id), second.data['user_message']['id'])
+        self.assertEqual(regenerated.depth, 3)
+
+        # The regenerated answer is sent the branch up to its question only
+        history = self.chat_completion.call_args.args[0]
+        self.assertEqual([m['content'] for m in history if m['role'] != 'system'], ['First', 'Hello!', 'Second'])
+
+        messages = self.client.get(f'/api/conversations/{conversation_id}/').data['messages']
+        self.assertEqual([m['content'] for m in messages], ['First', 'Hello!', 'Second', 'Regenerated'])
+        self.assertEqual(messages[-1]['siblings'], [answer_id, str(regenerated.pk)])
+
+    def test_regenerate_requires_an_assistant_message(self):
+        conversation_id = self.create_conversation()
+        response = self.client.post(f'/api/conversations/{conversation_id}/regenerate/', {}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+        first = self.add_message(conversation_id, 'First')
+        response = self.client.post(
+            f'/api/conversations/{conversation_id}/regenerate/',
+            {'message_id': first.data['user_message']['id']},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_branch_is_resolved_from_the_leaf(self):
+        conversation_id = self.create_conversation()
+        self.add_message(conversation_id, 'First')
+        self.add_message(conversation_id, 'Second')
+        conversation = Conversation.objects.get(pk=conversation_id)
+
+        with self.assertNumQueries(1):
+            messages = conversation.get_active_messages()
+        self.assertEqual([m.depth for m in messages], [0, 1, 2, 3])
+        self.assertEqual(messages[-1], conversation.active_message)
+        self.assertEqual(messages[0].get_latest_leaf(), conversation.active_message)
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_SIZE=1024)
+class TypingTests(APITestCase):
+    """
+    Tests for preparing the next turn while the user types.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def typing(self, conversation_id):
+        """Send the typing signal for a conversation."""
+        response = self.client.post(f'/api/conversations/{conversation_id}/typing/', {}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+    def test_add_message_reuses_the_prepared_history(self):
+        conversation_id = self.create_conversation()
+        self.add_message(conversation_id, 'First')
+        self.typing(conversation_id)
+
+        with mock.patch.object(PromptService, 'build_history', wraps=PromptService.build_history) as build_history:
+            self.add_message(conversation_id, 'Second')
+            build_history.assert_not_called()
+
+            history = self.chat_completion.call_args.args[0]
+            self.assertEqual([m['content'] for m in history if m['role'] != 'system'], ['First', 'Hello!', 'Second'])
+
+            # Without a typing signal for the new leaf, the history is built from the database
+            self.add_message(conversation_id, 'Third')
+            build_history.assert_called_once()
+
+    def test_prepared_history_follows_the_active_leaf(self):
+        conversation_id = self.create_conversation()
+        conversation = Conversation.objects.get(pk=conversation_id)
+
+        def prepared_key():
+            """Send the typing signal and return the key of the prepared history."""
+            self.typing(conversation_id)
+            conversation.refresh_from_db()
+            return PromptService.history_cache_key(conversation, conversation.active_message_id)
+
+        self.add_message(conversation_id, 'First')
+        first_key = prepared_key()
+        self.assertEqual(len(cache.get(first_key)['messages']), 2)
+
+        second = self.add_message(conversation_id, 'Second')
+        second_key = prepared_key()
+        self.assertNotEqual(second_key, first_key)
+        self.assertEqual(len(cache.get(second_key)['messages']), 4)
+
+        # A regenerated answer is a new leaf with its own history
+        self.chat_completion.return_value = 'Regenerated'
+        self.client.post(f'/api/conversations/{conversation_id}/regenerate/', {}, format='json')
+        regenerated_key = prepared_key()
+        self.assertNotEqual(regenerated_key, second_key)
+        self.assertEqual(cache.get(regenerated_key)['messages'][-1]['content'], 'Regenerated')
+
+        # Switching back finds the history prepared for the original answer
+        self.client.post(
+            f'/api/conversations/{conversation_id}/switch_branch/',
+            {'message_id': second.data['assistant_message']['id']},
+            format='json',
+        )
+        self.assertEqual(prepared_key(), second_key)
+        self.assertEqual(cache.get(second_key)['messages'][-1]['content'], 'Hello!')
+
+    def test_warm_up_threads_are_throttled(self):
+        provider, _ = get_provider('gpt-4o-mini')
+        provider._warmed_at = None
+        with mock.patch('chat.services.providers.base.threading.Thread') as thread:
+            for _ in range(3):
+                LLMService().warm('gpt-4o-mini')
+        thread.assert_called_once_with(target=provider.warm, args=('gpt-4o-mini',), daemon=True)
+
+
+@override_settings(FAN_OUT_MAX_MODELS=3)
+class FanOutTests(APITestCase):
+    """
+    Tests for multi-model turns.
+    """
+
+    MODELS = [{'model': 'gpt-4o-mini'}, {'model': 'gpt-4o', 'temperature': 0.2}, {'model': 'local:echo'}]
+
+    def setUp(self):
+        super().setUp()
+        self.chat_completion.side_effect = lambda messages, deployment, *args, **kwargs: f'Answer from {deployment}'
+
+    def test_replies_are_siblings_tagged_with_their_model(self):
+        conversation_id = self.create_conversation()
+        response = self.add_message(conversation_id, 'Compare', models=self.MODELS, temperature=0.5)
+
+        self.assertEqual(response.status_code, 201)
+        user_message = Message.objects.get(pk=response.data['user_message']['id'])
+        self.assertEqual(user_message.model, 'gpt-4o-mini')
+        replies = response.data['assistant_messages']
+        self.assertEqual(
+            [(reply['model'], reply['temperature'], reply['content']) for reply in replies],
+            [
+                ('gpt-4o-mini', 0.5, 'Answer from gpt-4o-mini'),
+                ('gpt-4o', 0.2, 'Answer from gpt-4o'),
+                ('local:echo', 0.5, 'Answer from local:echo'),
+            ],
+        )
+        self.assertEqual({reply['parent'] for reply in replies}, {user_message.pk})
+        self.assertEqual(user_message.children.count(), 3)
+
+        # The first reply is the active branch, and the others are its siblings
+        self.assertEqual(response.data['assistant_message'], replies[0])
+        messages = self.client.get(f'/api/conversations/{conversation_id}/').data['messages']
+        self.assertEqual([m['content'] for m in messages], ['Compare', 'Answer from gpt-4o-mini'])
+        self.assertEqual(messages[-1]['siblings'], [reply['id'] for reply in replies])
+
+        # The next turn continues the active branch
+        self.add_message(conversation_id, 'Next')
+        history = self.chat_completion.call_args.args[0]
+        self.assertEqual(
+            [m['content'] for m in history if m['role'] != 'system'], ['Compare', 'Answer from gpt-4o-mini', 'Next']
+        )
+
+    @override_settings(USAGE_QUOTAS={
+        'default': {'requests': 10, 'tokens': None, 'window': 3600},
+        'models': {'gpt-4o': {'requests': 1, 'tokens': None, 'window': 3600}},
+    })
+    def test_quota_is_reserved_for_all_models_or_none(self):
+        QuotaService.reserve(self.user, 'gpt-4o', 10, 10)
+        conversation_id = self.create_conversation()
+
+        response = self.add_message(conversation_id, models=self.MODELS)
+
+        self.assertEqual(response.status_code, 429)
+        self.chat_completion.assert_not_called()
+        self.assertFalse(Message.objects.filter(conversation_id=conversation_id).exists())
+        self.assertEqual(
+            dict(UsageCounter.objects.values_list('model', 'requests')), {'': 1, 'gpt-4o': 1}
+        )
+
+    def test_models_list_size_is_validated(self):
+        conversation_id = self.create_conversation()
+        for models in ([], self.MODELS + [{'model': 'gpt-4o'}]):
+            response = self.add_message(conversation_id, models=models)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('between 1 and 3', response.data['error'])
+
+        response = self.add_message(conversation_id, models=[{'temperature': 0.2}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('models', response.data)
+        self.chat_completion.assert_not_called()
+
+
+class CompressionMiddlewareTests(PrimaryTestCase):
+    """
+    Tests for response compression negotiation.
+    """
+    BODY = b'{"content": "' + b'Lorem ipsum dolor sit amet. ' * 100 + b'"}'
+
+    def process(self, accept_encoding, body=BODY, prepare=None):
+        """Run a JSON response with a strong ETag through the middleware."""
+        request = RequestFactory().get('/api/conversations/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = '"abc"'
+        if prepare:
+            prepare(request, response)
+        return CompressionMiddleware(lambda request: response).process_response(request, response)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.process('br, gzip', body=b'{"content": "short"}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['ETag'], '"abc"')
+
+    def test_brotli_is_preferred(self):
+        response = self.process('gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.BODY)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip_without_brotli_support(self):
+        response = self.process('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.BODY)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+        response = self.process('identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.BODY)
+
+    def test_responses_with_secrets_use_padded_gzip(self):
+        def use_csrf_token(request, response):
+            get_token(request)
+
+        def read_session(request, response):
+            request.session = SessionStore()
+            request.session.get('_auth_user_id')
+
+        def set_cookie(request, response):
+            response.set_cookie('sessionid', 'secret')
+
+        for prepare in (use_csrf_token, read_session, set_cookie):
+            response = self.process('br, gzip', prepare=prepare)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_token_authenticated_api_responses_use_brotli(self):
+        user = User.objects.create_user('alice', password='password')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        conversation = Conversation.objects.create(user=user, title='T')
+        conversation.set_active_message(conversation.create_message(None, role='user', content=self.BODY.decode()))
+
+        response = client.get(f'/api/conversations/{conversation.pk}/', HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+
+class FastReadTests(PrimaryTestCase):
+    """
+    Tests that the fast serialization path matches DRF's output.
+    """
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('alice', password='password')
+        self.conversation = Conversation.objects.create(user=user, title='Lists')
+        root = self.conversation.create_message(None, role='user', content='Sort a list please')
+        self.message = self.conversation.create_message(
+            root, role='assistant', content='Use `sorted()`.', model='gpt-4o', temperature=0.2
+        )
+        self.conversation.set_active_message(self.message)
+
+    def test_serializers_match_model_serializers(self):
+        class BaselineMessageSerializer(serializers.ModelSerializer):
+            class Meta(MessageSerializer.Meta):
+                pass
+
+        class BaselineIndexSerializer(serializers.ModelSerializer):
+            id = serializers.UUIDField(source='conversation_id', read_only=True)
+
+            class Meta(ConversationIndexSerializer.Meta):
+                pass
+
+        messages = list(Message.objects.all())
+        messages.append(Message(id=uuid.uuid4(), role='user', content='Unsaved', created_at=timezone.now()))
+        with override_settings(MESSAGE_COMPRESSION={'enabled': True, 'min_size': 1}):
+            messages.append(self.conversation.create_message(self.message, role='user', content='x' * 100))
+        messages.append(Message.objects.get(pk=messages[-1].pk))
+        self.assertEqual(MessageSerializer(messages, many=True).data, BaselineMessageSerializer(messages, many=True).data)
+
+        entries = ConversationIndex.objects.all()
+        self.assertEqual(
+            ConversationIndexSerializer(entries, many=True).data, BaselineIndexSerializer(entries, many=True).data
+        )
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'messages': MessageSerializer(Message.objects.all(), many=True).data,
+            'created_at': timezone.now(),
+            'price': Decimal('1.50'),
+            'id': uuid.uuid4(),
+            'name': gettext_lazy('Title'),
+            1: None,
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertIn(b'\\u2028', ORJSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), JSONRenderer().render(None))
+
+        indented = 'application/json; indent=2'
+        self.assertEqual(ORJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+
+LOCAL_PROVIDERS = {
+    'azure': {'BACKEND': 'chat.services.providers.azure.AzureOpenAIProvider'},
+    'local': {
+        'BACKEND': 'chat.services.providers.local.LocalCPUProvider',
+        'OPTIONS': {'workers': 1, 'timeout': 60, 'models': {'echo': {'backend': 'echo'}}},
+    },
+}
+
+
+@override_settings(
+    LLM_DEFAULT_PROVIDER='azure',
+    LLM_PROVIDERS=LOCAL_PROVIDERS,
+    LLM_MODEL_ROUTES={'small': 'local:echo'},
+    TITLE_GENERATION_BACKGROUND=False,
+)
+class ProviderTests(PrimaryTestCase):
+    """
+    Tests for provider routing and the local CPU provider.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(providers._providers, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: [provider.close() for provider in providers._providers.values()])
+
+    def test_resolve_model(self):
+        self.assertEqual(resolve_model('local:echo'), ('local', 'echo'))
+        self.assertEqual(resolve_model('small'), ('local', 'echo'))
+        self.assertEqual(resolve_model('gpt-4o'), ('azure', 'gpt-4o'))
+        # An unknown provider name is part of a default provider model name
+        self.assertEqual(resolve_model('unknown:gpt-4o'), ('azure', 'unknown:gpt-4o'))
+
+    def test_get_provider(self):
+        provider, model = get_provider('local:echo')
+        self.assertIsInstance(provider, LocalCPUProvider)
+        self.assertEqual((model, provider.workers), ('echo', 1))
+        self.assertEqual(get_provider('small'), (provider, 'echo'))
+        self.assertIsInstance(get_provider('unknown:gpt-4o')[0], AzureOpenAIProvider)
+
+    def test_add_message_is_answered_by_the_local_pool(self):
+        user = User.objects.create_user('alice', password='password')
+        client = APIClient()
+        client.force_authenticate(user)
+        conversation = Conversation.objects.create(user=user, title='Offline')
+
+        response = client.post(
+            f'/api/conversations/{conversation.pk}/add_message/',
+            {'role': 'user', 'content': 'Hello local', 'model': 'local:echo'},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['assistant_message']['content'], 'Echo: Hello local')
+        self.assertEqual(response.data['assistant_message']['model'], 'local:echo')
+        self.assertIsNotNone(get_provider('local:echo')[0]._pool)
+
+    def test_unknown_local_model_is_a_provider_error(self):
+        provider, _ = get_provider('local:echo')
+        with self.assertRaisesMessage(LLMServiceError, 'Unknown local model: missing'):
+            provider.complete([{'role': 'user', 'content': 'Hi'}], 'missing', 0.7, 16)
+        self.assertIsNone(provider._pool)
+
+        response = LLMService().generate_response([{'role': 'user', 'content': 'Hi'}], 'local:missing')
+        self.assertEqual(response, "I'm sorry, I encountered an error generating a response.")
+
+    def test_pool_timeout_is_a_provider_error(self):
+        provider, _ = get_provider('local:echo')
+        provider.timeout = 0.01
+        pending = Future()
+        pool = mock.Mock(submit=mock.Mock(return_value=pending))
+        with mock.patch.object(provider, '_get_pool', return_value=pool):
+            with self.assertRaisesMessage(LLMServiceError, 'Local model echo timed out after 0.01s'):
+                provider.complete([{'role': 'user', 'content': 'Hi'}], 'echo', 0.7, 16)
+        self.assertTrue(pending.cancelled())
+
+
+@override_settings(USAGE_QUOTAS={
+    'default': {'requests': 2, 'tokens': 10000, 'window': 3600},
+    'models': {'small': {'requests': 1, 'tokens': None, 'window': 60}},
+})
+class QuotaTests(APITestCase):
+    """
+    Tests for usage quotas.
+    """
+
+    def test_exhausted_quota_is_throttled(self):
+        conversation_id = self.create_conversation()
+        self.assertEqual(self.add_message(conversation_id).status_code, 201)
+        self.assertEqual(self.add_message(conversation_id).status_code, 201)
+
+        response = self.add_message(conversation_id)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.chat_completion.call_count, 2)
+
+    def test_reservation_is_atomic_across_quotas(self):
+        QuotaService.reserve(self.user, 'small', 10, 10)
+
+        with self.assertRaises(QuotaExceeded):
+            QuotaService.reserve(self.user, 'small', 10, 10)
+
+        # The all-models reservation made before the model quota failed was rolled back
+        counter = UsageCounter.objects.get(user=self.user, model='')
+        self.assertEqual((counter.requests, counter.tokens), (1, 20))
+
+    def test_settle_and_release(self):
+        reservation = QuotaService.reserve(self.user, 'large', 10, 100)
+        QuotaService.settle(reservation, 5)
+        QuotaService.release(reservation)
+        counter = UsageCounter.objects.get(user=self.user, model='')
+        self.assertEqual((counter.requests, counter.tokens), (1, 15))
+
+        QuotaService.release(QuotaService.reserve(self.user, 'large', 10, 100))
+        counter.refresh_from_db()
+        self.assertEqual((counter.requests, counter.tokens), (1, 15))
+
+    def test_failed_turn_releases_its_reservation(self):
+        conversation_id = self.create_conversation()
+
+        with mock.patch.object(Conversation, 'create_message', side_effect=DatabaseError('write failed')):
+            with self.assertRaises(DatabaseError):
+                self.add_message(conversation_id)
+
+        counter = UsageCounter.objects.get(user=self.user, model='')
+        self.assertEqual((counter.requests, counter.tokens), (0, 0))
+
+    @override_settings(LLM_DEFAULT_PROVIDER='azure', LLM_MODEL_ROUTES={'mini': 'small', 'tiny': 'local:echo'})
+    def test_model_quota_applies_to_aliases_and_provider_prefixes(self):
+        QuotaService.reserve(self.user, 'azure:small', 10, 10)
+        for model in ('small', 'mini'):
+            with self.assertRaises(QuotaExceeded):
+                QuotaService.reserve(self.user, model, 10, 10)
+        self.assertEqual(UsageCounter.objects.get(user=self.user, model='small').requests, 1)
+
+        with override_settings(USAGE_QUOTAS={'models': {'tiny': {'requests': 1, 'tokens': None}}}):
+            QuotaService.reserve(self.user, 'local:echo', 10, 10)
+            with self.assertRaises(QuotaExceeded):
+                QuotaService.reserve(self.user, 'tiny', 10, 10)
+            self.assertEqual(UsageCounter.objects.get(user=self.user, model='local:echo').requests, 1)
+
+    @override_settings(USAGE_QUOTAS={})
+    def test_fan_out_holds_a_slot_per_model(self):
+        scheduler = FairScheduler(capacity=4, timeout=5)
+        running = []
+        self.chat_completion.side_effect = lambda *args, **kwargs: running.append(scheduler._running) or 'Hello!'
+        conversation_id = self.create_conversation()
+
+        with mock.patch('chat.views.get_scheduler', return_value=scheduler):
+            response = self.add_message(conversation_id, models=[{'model': 'gpt-4o'}, {'model': 'gpt-4o-mini'}])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(running, [2, 2])
+        self.assertEqual(scheduler._running, 0)
+
+
+class FairSchedulerTests(TestCase):
+    """
+    Tests for the fair-share generation scheduler.
+    """
+
+    def queue(self, scheduler, user_id, weight, order):
+        """Start a generation that waits for a slot, and wait until it is queued."""
+        def generate():
+            with scheduler.slot(user_id, weight):
+                order.append(user_id)
+
+        queued = len(scheduler._queues.get(user_id, ()))
+        thread = threading.Thread(target=generate)
+        thread.start()
+        while len(scheduler._queues.get(user_id, ())) == queued:
+            time.sleep(0.001)
+        return thread
+
+    def test_slots_are_shared_by_weighted_round_robin(self):
+        scheduler = FairScheduler(capacity=1, timeout=5)
+        scheduler.acquire('holder')
+        order = []
+        threads = [self.queue(scheduler, 'busy', 1, order) for _ in range(4)]
+        threads += [self.queue(scheduler, 'staff', 2, order) for _ in range(4)]
+        threads += [self.queue(scheduler, 'light', 1, order)]
+
+        scheduler.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, ['staff', 'busy', 'light', 'staff', 'staff', 'busy', 'staff', 'busy', 'busy'])
+
+    def test_timeout_removes_the_waiting_generation(self):
+        scheduler = FairScheduler(capacity=1, timeout=0.05)
+        scheduler.acquire('holder')
+
+        with self.assertRaises(SchedulerTimeout):
+            scheduler.acquire('waiting')
+
+        self.assertEqual(scheduler._queues, {})
+        scheduler.release()
+        with scheduler.slot('next'):
+            self.assertEqual(scheduler._running, 1)
+
+    def test_generation_waits_for_all_its_slots(self):
+        scheduler = FairScheduler(capacity=3, timeout=5)
+        scheduler.acquire('holder', slots=2)
+        order = []
+
+        def generate():
+            with scheduler.slot('fan-out', slots=2):
+                order.append('fan-out')
+
+        fan_out = threading.Thread(target=generate)
+        fan_out.start()
+        while not scheduler._queues:
+            time.sleep(0.001)
+        # One free slot is not enough for the fan-out, and later generations queue behind it
+        single = self.queue(scheduler, 'single', 1, order)
+        self.assertEqual((scheduler._running, order), (2, []))
+
+        scheduler.release(2)
+        fan_out.join()
+        single.join()
+        self.assertEqual(sorted(order), ['fan-out', 'single'])
+        self.assertEqual(scheduler._running, 0)
+
+    def test_slots_are_capped_at_the_capacity(self):
+        scheduler = FairScheduler(capacity=2, timeout=0.05)
+        with scheduler.slot('fan-out', slots=4):
+            self.assertEqual(scheduler._running, 2)
+        self.assertEqual(scheduler._running, 0)
+
+
+@override_settings(MESSAGE_COMPRESSION={'enabled': True, 'min_size': 100, 'level': 3})
+class MessageCompressionTests(PrimaryTestCase):
+    """
+    Tests for storing message content compressed.
+    """
+
+    TEXT = 'The quick brown fox jumps over the lazy dog. ' * 20
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('alice', password='password')
+        self.conversation = Conversation.objects.create(user=user, title='Compressed')
+
+    def test_large_content_is_stored_compressed(self):
+        message = self.conversation.create_message(None, role='user', content=self.TEXT)
+
+        stored = Message.objects.values_list('content', 'content_compressed').get(pk=message.pk)
+        self.assertEqual(stored[0], '')
+        self.assertLess(len(stored[1]), len(self.TEXT) // 4)
+        self.assertEqual(Message.objects.get(pk=message.pk).content, self.TEXT)
+
+    def test_small_content_is_stored_as_text(self):
+        message = self.conversation.create_message(None, role='user', content='Hi')
+
+        stored = Message.objects.values_list('content', 'content_compressed').get(pk=message.pk)
+        self.assertEqual(stored, ('Hi', None))
+
+    def test_content_is_decompressed_lazily_and_kept_on_save(self):
+        message = self.conversation.create_message(None, role='user', content=self.TEXT)
+        message = Message.objects.get(pk=message.pk)
+        self.assertIsInstance(message.__dict__['content'], StoredText)
+
+        message.role = 'assistant'
+        message.save()
+
+        message = Message.objects.get(pk=message.pk)
+        self.assertIsInstance(message.__dict__['content'], StoredText)
+        self.assertEqual(message.content, self.TEXT)
+
+    def test_command_converts_existing_rows(self):
+        with self.settings(MESSAGE_COMPRESSION={'enabled': False}):
+            message = self.conversation.create_message(None, role='user', content=self.TEXT)
+        self.assertIsNone(Message.objects.get(pk=message.pk).content_compressed)
+
+        call_command('compress_messages', stdout=StringIO())
+        self.assertIsNotNone(Message.objects.get(pk=message.pk).content_compressed)
+
+        call_command('compress_messages', '--decompress', stdout=StringIO())
+        stored = Message.objects.values_list('content', 'content_compressed').get(pk=message.pk)
+        self.assertEqual(stored, (self.TEXT, None))
+
+    def test_benchmark_reports_savings(self):
+        self.conversation.create_message(None, role='user', content=self.TEXT)
+        out = StringIO()
+
+        call_command('compress_messages', '--benchmark', stdout=out)
+
+        self.assertIn('% saved', out.getvalue())
+
+
+class TitleServiceTests(APITestCase):
+    """
+    Tests for generating conversation titles in batches.
+    """
+
+    def create_exchange(self, question, title='New Conversation', answer='Sure.'):
+        """Create a conversation with a question and, unless answer is None, its answer."""
+        conversation = Conversation.objects.create(user=self.user, title=title)
+        message = conversation.create_message(None, role='user', content=question)
+        if answer is not None:
+            message = conversation.create_message(message, role='assistant', content=answer)
+        conversation.set_active_message(message)
+        return conversation
+
+    def test_pending_conversations(self):
+        pending = self.create_exchange('How do I sort a list')
+        self.create_exchange('Unanswered question', answer=None)
+        self.create_exchange('Already named', title='My title')
+
+        self.assertEqual([c.pk for c in TitleService.pending_conversations()], [pending.pk])
+        self.assertEqual(TitleService.pending_conversations().get().first_message, 'How do I sort a list')
+
+    def test_generated_titles_update_the_index(self):
+        conversation = self.create_exchange('How do I sort a list. In Python')
+
+        self.assertEqual(TitleService(use_llm=False).generate_pending(), 1)
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.title, 'How do I sort a list...')
+        self.assertEqual(ConversationIndex.objects.get(pk=conversation.pk).title, conversation.title)
+        self.assertFalse(TitleService.pending_conversations().exists())
+
+    def test_rename_during_generation_is_kept(self):
+        conversation = self.create_exchange('How do I sort a list')
+        service = TitleService(use_llm=False)
+        titles = service.generate_titles(list(TitleService.pending_conversations()))
+
+        conversation.title = 'Renamed by the user'
+        conversation.save()
+
+        self.assertEqual(service.save_titles(titles), 0)
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.title, 'Renamed by the user')
+        self.assertEqual(ConversationIndex.objects.get(pk=conversation.pk).title, 'Renamed by the user')
+
+    def test_llm_titles_scale_max_tokens_and_fall_back_per_line(self):
+        first = self.create_exchange('How do I sort a list')
+        second = self.create_exchange('What is a closure')
+        self.chat_completion.return_value = '1. Sorting lists in Python'
+
+        TitleService(use_llm=True).generate_pending()
+
+        self.assertEqual(self.chat_completion.call_args.kwargs['max_tokens'], 32)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.title, 'Sorting lists in Python')
+        self.assertEqual(second.title, 'What is a closure...')
+
+    def test_llm_failure_falls_back_to_the_heuristic(self):
+        conversation = self.create_exchange('How do I sort a list')
+        self.chat_completion.side_effect = LLMServiceError('upstream failed')
+
+        TitleService(use_llm=True).generate_pending()
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.title, 'How do I sort a list...')
@@ -4,6 +4,7 @@ from . import views
 
 router = DefaultRouter()
 router.register(r'conversations', views.ConversationViewSet, basename='conversation')
+router.register(r'prompt-profiles', views.PromptProfileViewSet, basename='prompt-profile')
 router.register(r'users', views.UserViewSet)
 
 urlpatterns = [
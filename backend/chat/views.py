@@ -1,10 +1,26 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, Throttled
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Conversation, Message
-from .serializers import UserSerializer, ConversationSerializer, MessageSerializer
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from contextlib import contextmanager
+import hashlib
+from .models import Conversation, ConversationIndex, Message, PromptProfile
+from .serializers import (
+    UserSerializer, ConversationSerializer, ConversationIndexSerializer, GenerationTargetSerializer,
+    MessageSerializer, PromptProfileSerializer
+)
 from .services.llm_service import LLMService
+from .services.prompt_service import PromptService, count_message_tokens, count_tokens
+from .services.quota_service import QuotaExceeded, QuotaService, QuotaUnsatisfiable
+from .services.scheduler import SchedulerTimeout, get_scheduler, get_weight
+from .services.title_service import TitleService
 
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
@@ -35,6 +51,24 @@ class IsOwner(permissions.BasePermission):
         return obj.user == request.user
 
 
+class GenerationTooLarge(APIException):
+    """
+    Raised when a generation can never fit the user's token quota.
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'This message needs more tokens than your quota allows.'
+    default_code = 'generation_too_large'
+
+
+class GenerationUnavailable(APIException):
+    """
+    Raised when a generation could not get a scheduler slot in time.
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The service is busy, please try again shortly.'
+    default_code = 'generation_unavailable'
+
+
 class ConversationViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing conversations.
@@ -60,13 +94,208 @@ class ConversationViewSet(viewsets.ModelViewSet):
         """
         return Conversation.objects.filter(user=self.request.user)
 
+    def list(self, request):
+        """
+        List the current user's conversations for the sidebar.
+        
+        Entries are read from the denormalized ConversationIndex, newest first.
+        The response carries an ETag derived from the index; a request whose
+        If-None-Match matches it gets 304 Not Modified without any
+        serialization. The optional `modified_since` query parameter (ISO 8601)
+        limits the list to entries changed after that time. Deletions are not
+        reported by `modified_since`; clients detect them through the
+        X-Total-Count header and refetch the full list.
+        
+        Args:
+            request: The HTTP request
+            
+        Returns:
+            Response: The serialized index entries, or 304 Not Modified
+        """
+        entries = ConversationIndex.objects.filter(user=request.user)
+        
+        stats = entries.aggregate(count=Count('pk'), last_updated=Max('updated_at'))
+        last_updated = stats['last_updated'].isoformat() if stats['last_updated'] else ''
+        etag = quote_etag(hashlib.md5(
+            f"{request.user.pk}:{stats['count']}:{last_updated}".encode()
+        ).hexdigest())
+        headers = {'ETag': etag, 'X-Total-Count': str(stats['count'])}
+        
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        modified_since = request.query_params.get('modified_since')
+        if modified_since:
+            try:
+                modified_since = parse_datetime(modified_since)
+            except ValueError:
+                modified_since = None
+            if modified_since is None:
+                return Response(
+                    {'error': 'modified_since must be an ISO 8601 datetime'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(modified_since):
+                # Times without an offset are in the server's time zone, like the rest of the API
+                modified_since = timezone.make_aware(modified_since)
+            entries = entries.filter(updated_at__gt=modified_since)
+        
+        serializer = ConversationIndexSerializer(entries.order_by('-updated_at'), many=True)
+        return Response(serializer.data, headers=headers)
+
+    def _get_history(self, conversation, leaf_id, content=None):
+        """
+        Get the branch ending at a message, formatted for the LLM.
+        
+        A history prepared by the typing action is reused, so only the new
+        user turn is formatted and counted here.
+        
+        Args:
+            conversation (Conversation): The conversation the branch belongs to
+            leaf_id (UUID): Id of the last message, or None for none
+            content (str): Content of a new user turn to append, if any
+            
+        Returns:
+            dict: 'messages' as {"role", "content"} dicts from the root, and their 'token_count'
+        """
+        history = PromptService.get_history(conversation, leaf_id)
+        if content is None:
+            return history
+        
+        user_turn = {"role": "user", "content": content}
+        return {
+            'messages': [*history['messages'], user_turn],
+            'token_count': history['token_count'] + count_message_tokens([user_turn]),
+        }
+
+    @contextmanager
+    def _generation_slot(self, conversation, history, models):
+        """
+        Reserve quota and a scheduler slot for the generations of one turn.
+        
+        The prompt's tokens plus the profile's max_tokens are reserved against
+        the user's quotas for every model before anything is written or sent
+        upstream, then the turn waits for its turn in the fair-share scheduler.
+        A multi-model turn holds one slot per model, since each call is a generation.
+        Reservations that were not settled are released if the turn fails.
+        
+        Args:
+            conversation (Conversation): The conversation being answered
+            history (dict): The formatted history that will be sent, from _get_history
+            models (list): The model names/deployments to generate with
+            
+        Yields:
+            tuple: (prompt prefix, list of quota reservations, one per model)
+            
+        Raises:
+            GenerationTooLarge: If the turn needs more tokens than a quota allows (400)
+            Throttled: If a quota is exhausted (429 with Retry-After)
+            GenerationUnavailable: If no slot was free in time (503)
+        """
+        prompt_prefix = PromptService.get_conversation_prefix(conversation)
+        prompt_tokens = prompt_prefix['token_count'] + history['token_count']
+        user = self.request.user
+        
+        reservations = []
+        try:
+            for model in models:
+                reservations.append(
+                    QuotaService.reserve(user, model, prompt_tokens, prompt_prefix['max_tokens'])
+                )
+        except QuotaUnsatisfiable as e:
+            for reservation in reservations:
+                QuotaService.release(reservation)
+            raise GenerationTooLarge(detail=str(e))
+        except QuotaExceeded as e:
+            for reservation in reservations:
+                QuotaService.release(reservation)
+            raise Throttled(wait=e.retry_after, detail=str(e))
+        
+        try:
+            with get_scheduler().slot(user.pk, get_weight(user), slots=len(models)):
+                yield prompt_prefix, reservations
+        except SchedulerTimeout:
+            for reservation in reservations:
+                QuotaService.release(reservation)
+            raise GenerationUnavailable()
+        except BaseException:
+            # Give back what a failed turn reserved but did not use
+            for reservation in reservations:
+                QuotaService.release(reservation)
+            raise
+
+    def _generate_replies(self, conversation, parent, history, targets, prompt_prefix, reservations):
+        """
+        Generate assistant replies to a message and make the first one the active branch.
+        
+        With several targets, the models are called concurrently and every
+        reply is stored as a sibling branch tagged with its model.
+        
+        Args:
+            conversation (Conversation): The conversation being answered
+            parent (Message): The user message to reply to
+            history (dict): The formatted branch ending at the parent, from _get_history
+            targets (list): (model, temperature) tuples, one per reply
+            prompt_prefix (dict): The cached prompt prefix for the conversation
+            reservations (list): The quota reservations of the targets, settled to the tokens used
+            
+        Returns:
+            list: The newly created assistant messages, in the order of targets
+        """
+        # Generate AI responses using the LLM service and the cached prompt prefix
+        llm_service = LLMService()
+        responses = llm_service.generate_responses(history['messages'], targets, prompt_prefix=prompt_prefix)
+        
+        # Settle first: the tokens were used even if storing a reply fails
+        for response, reservation in zip(responses, reservations):
+            QuotaService.settle(reservation, count_tokens(response))
+        
+        assistant_messages = []
+        for (model, temperature), response in zip(targets, responses):
+            # Create the assistant message with the same model and temperature values
+            assistant_messages.append(conversation.create_message(
+                parent,
+                role='assistant',
+                content=response,
+                model=model,
+                temperature=temperature
+            ))
+        conversation.set_active_message(assistant_messages[0])
+        return assistant_messages
+
+    def _get_message(self, conversation, message_id, role=None):
+        """
+        Get a message of the conversation by id.
+        
+        Args:
+            conversation (Conversation): The conversation the message must belong to
+            message_id (str): The id of the message
+            role (str): If given, the role the message must have
+            
+        Returns:
+            Message: The message, or None if it does not exist or does not match
+        """
+        filters = {'conversation': conversation, 'pk': message_id}
+        if role:
+            filters['role'] = role
+        try:
+            return Message.objects.filter(**filters).first()
+        except (ValueError, DjangoValidationError):
+            return None
+
     @action(detail=True, methods=['post'])
     def add_message(self, request, pk=None):
         """
         Add a new message to a conversation and get an AI response.
         
-        This action adds a user message to the conversation and then
-        generates an AI assistant response using the LLM service.
+        This action adds a user message at the end of the active branch and
+        then generates an AI assistant response using the LLM service.
+        
+        To compare models, 'models' may list up to FAN_OUT_MAX_MODELS
+        {'model', 'temperature'} objects instead. All of them answer the same
+        history concurrently; each answer is stored as a sibling branch and
+        the first one becomes the active branch.
         
         Args:
             request: The HTTP request containing the message data
@@ -81,42 +310,134 @@ class ConversationViewSet(viewsets.ModelViewSet):
         model = request.data.get('model', 'gpt-4o-mini')
         temperature = request.data.get('temperature', 0.7)
         
+        targets = [(model, temperature)]
+        fan_out = 'models' in request.data
+        if fan_out:
+            max_models = getattr(settings, 'FAN_OUT_MAX_MODELS', 4)
+            targets_serializer = GenerationTargetSerializer(data=request.data['models'], many=True)
+            if not targets_serializer.is_valid():
+                return Response({'models': targets_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            if not 1 <= len(targets_serializer.validated_data) <= max_models:
+                return Response(
+                    {'error': f'models must list between 1 and {max_models} models'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            targets = [
+                (target['model'], target.get('temperature', temperature))
+                for target in targets_serializer.validated_data
+            ]
+            model, temperature = targets[0]
+        
         serializer = MessageSerializer(data=request.data)
         if serializer.is_valid():
-            # Save the user message with model and temperature
-            user_message = serializer.save(
-                conversation=conversation,
-                model=model,
-                temperature=temperature
+            # One history snapshot, from the root, shared by all models of the turn
+            history = self._get_history(
+                conversation, conversation.active_message_id, serializer.validated_data['content']
             )
             
-            # Get conversation history for context
-            conversation_history = Message.objects.filter(
-                conversation=conversation
-            ).order_by('created_at')
+            models = [target_model for target_model, _ in targets]
+            with self._generation_slot(conversation, history, models) as (prompt_prefix, reservations):
+                # Save the user message with model and temperature
+                user_message = conversation.create_message(
+                    conversation.active_message,
+                    **{**serializer.validated_data, 'model': model, 'temperature': temperature}
+                )
+                
+                assistant_messages = self._generate_replies(
+                    conversation, user_message, history, targets, prompt_prefix, reservations
+                )
             
-            # Format conversation history for the LLM
-            formatted_history = [
-                {
-                    "role": msg.role,
-                    "content": msg.content
-                } for msg in conversation_history
-            ]
+            # Generate a title in the background once the first exchange exists
+            if conversation.has_default_title:
+                TitleService.schedule()
             
-            # Generate AI response using the LLM service
-            llm_service = LLMService()
-            assistant_response = llm_service.generate_response(formatted_history, model, temperature)
+            # Return both messages, and every answer of a multi-model turn
+            data = {
+                'user_message': MessageSerializer(user_message).data,
+                'assistant_message': MessageSerializer(assistant_messages[0]).data
+            }
+            if fan_out:
+                data['assistant_messages'] = MessageSerializer(assistant_messages, many=True).data
+            return Response(data, status=status.HTTP_201_CREATED)
             
-            # Create the assistant message with the same model and temperature values
-            assistant_message = Message.objects.create(
-                conversation=conversation,
-                role='assistant',
-                content=assistant_response,
-                model=model,
-                temperature=temperature
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def regenerate(self, request, pk=None):
+        """
+        Generate a new answer as a sibling branch of an assistant message.
+        
+        The previous answer is kept; the new one becomes the active branch.
+        
+        Args:
+            request: The HTTP request with an optional 'message_id' of the
+                assistant message to regenerate (defaults to the active one),
+                and optional 'model' and 'temperature'
+            pk: The primary key of the conversation
+            
+        Returns:
+            Response: The serialized assistant message or error response
+        """
+        conversation = self.get_object()
+        
+        message_id = request.data.get('message_id')
+        if not message_id:
+            message_id = conversation.active_message_id
+        message = self._get_message(conversation, message_id, role='assistant') if message_id else None
+        if message is None or message.parent_id is None:
+            return Response({'error': 'Assistant message not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        model = request.data.get('model', message.model or 'gpt-4o-mini')
+        temperature = request.data.get('temperature', message.temperature if message.temperature is not None else 0.7)
+        
+        parent = message.parent
+        history = self._get_history(conversation, parent.pk)
+        with self._generation_slot(conversation, history, [model]) as (prompt_prefix, reservations):
+            assistant_message, = self._generate_replies(
+                conversation, parent, history, [(model, temperature)], prompt_prefix, reservations
             )
+        return Response({
+            'assistant_message': MessageSerializer(assistant_message).data
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def edit_message(self, request, pk=None):
+        """
+        Edit a user message by creating a sibling branch and answering it.
+        
+        The original message and everything after it are kept on their own
+        branch; the edited message and its answer become the active branch.
+        
+        Args:
+            request: The HTTP request with 'message_id' of the user message,
+                the new 'content', and optional 'model' and 'temperature'
+            pk: The primary key of the conversation
+            
+        Returns:
+            Response: The serialized message data or error response
+        """
+        conversation = self.get_object()
+        
+        message = self._get_message(conversation, request.data.get('message_id'), role='user')
+        if message is None:
+            return Response({'error': 'User message not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        model = request.data.get('model', message.model or 'gpt-4o-mini')
+        temperature = request.data.get('temperature', message.temperature if message.temperature is not None else 0.7)
+        
+        serializer = MessageSerializer(data={'role': 'user', 'content': request.data.get('content')})
+        if serializer.is_valid():
+            history = self._get_history(conversation, message.parent_id, serializer.validated_data['content'])
             
-            # Return both messages
+            with self._generation_slot(conversation, history, [model]) as (prompt_prefix, reservations):
+                user_message = conversation.create_message(
+                    message.parent,
+                    **{**serializer.validated_data, 'model': model, 'temperature': temperature}
+                )
+                
+                assistant_message, = self._generate_replies(
+                    conversation, user_message, history, [(model, temperature)], prompt_prefix, reservations
+                )
             return Response({
                 'user_message': MessageSerializer(user_message).data,
                 'assistant_message': MessageSerializer(assistant_message).data
@@ -124,6 +445,86 @@ class ConversationViewSet(viewsets.ModelViewSet):
             
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def switch_branch(self, request, pk=None):
+        """
+        Make the branch through a given message the active one.
+        
+        The active branch continues to the most recent message below the
+        given one, which is always a leaf.
+        
+        Args:
+            request: The HTTP request with 'message_id' of any message on the branch
+            pk: The primary key of the conversation
+            
+        Returns:
+            Response: The serialized conversation or error response
+        """
+        conversation = self.get_object()
+        
+        message = self._get_message(conversation, request.data.get('message_id'))
+        if message is None:
+            return Response({'error': 'Message not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        conversation.set_active_message(message.get_latest_leaf())
+        
+        return Response(self.get_serializer(conversation).data)
+
+    @action(detail=True, methods=['post'])
+    def typing(self, request, pk=None):
+        """
+        Prepare the next turn while the user is typing.
+        
+        The active branch's history is formatted, counted and cached briefly,
+        the prompt prefix is loaded into its cache, and the upstream
+        connection for the model is warmed in the background, so the
+        following add_message only appends the new user turn and sends.
+        Clients call this when the user starts typing; repeated calls within
+        the cache lifetime are cheap.
+        
+        Args:
+            request: The HTTP request with the optional 'model' that will be used
+            pk: The primary key of the conversation
+            
+        Returns:
+            Response: Empty response with 204 No Content status
+        """
+        conversation = self.get_object()
+        
+        PromptService.prepare_history(conversation, conversation.active_message_id)
+        PromptService.get_conversation_prefix(conversation)
+        
+        LLMService().warm(request.data.get('model', 'gpt-4o-mini'))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PromptProfileViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet for managing prompt profiles.
+    
+    This viewset provides CRUD operations for the system prompt, max_tokens
+    and stop sequences used when generating responses.
+    
+    Permissions:
+        - User must be authenticated
+        - User must be the owner of the profile
+    """
+    serializer_class = PromptProfileSerializer
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    
+    def get_queryset(self):
+        """
+        Get the queryset of prompt profiles for the current user.
+        
+        Returns:
+            QuerySet: Filtered queryset containing only the user's profiles
+        """
+        return PromptProfile.objects.filter(user=self.request.user)
+    
+    def perform_create(self, serializer):
+        """Assign the current user to the new profile."""
+        serializer.save(user=self.request.user)
+
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -0,0 +1,153 @@
+"""
+Database routing between the primary database and read replicas.
+
+Enabled by the `chat_backend.settings_replica` settings profile.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+PRIMARY_DB = "default"
+
+# Models that authenticate a request. They are always read from the primary,
+# so a token or session created by a login works on the very next request.
+CREDENTIAL_MODELS = {"auth.user", "authtoken.token", "sessions.session"}
+
+_use_primary = ContextVar("use_primary", default=False)
+_current_request = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def use_primary():
+    """
+    Send all reads in a with block to the primary database.
+    """
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def pin_key(user_id):
+    """Return the cache key of a user's pin to the primary database."""
+    return f"primary-pin:{user_id}"
+
+
+def is_pinned(request):
+    """
+    Return whether a request's user wrote within the last REPLICA_PIN_SECONDS.
+
+    The user is only known once the request is authenticated; until then
+    the request is not pinned. The answer is remembered on the request.
+    """
+    pinned = getattr(request, "_primary_pinned", None)
+    if pinned is None:
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return False
+        pinned = request._primary_pinned = bool(cache.get(pin_key(user.pk)))
+    return pinned
+
+
+def get_replica(request, replicas):
+    """
+    Return the replica a request reads from, chosen at random once per request.
+
+    Replicas lag by different amounts, so reading every query of a request
+    from the same one keeps the request's view of the data consistent.
+    """
+    replica = getattr(request, "_replica", None)
+    if replica not in replicas:
+        replica = request._replica = random.choice(replicas)
+    return replica
+
+
+class PrimaryReplicaRouter:
+    """
+    Route writes to the primary database and reads to a replica.
+
+    Replicas are the aliases listed in DATABASE_REPLICAS; each request reads
+    from one replica picked at random, and reads outside of requests from
+    any of them. Reads go to the
+    primary instead inside use_primary(), which PrimaryPinningMiddleware
+    applies to every write request, and for requests of a user who wrote
+    within the last REPLICA_PIN_SECONDS, so users always read their own
+    writes. Credentials (CREDENTIAL_MODELS) are always read from the primary.
+    """
+
+    def _replicas(self):
+        return [alias for alias in getattr(settings, "DATABASE_REPLICAS", []) if alias in settings.DATABASES]
+
+    def db_for_read(self, model, **hints):
+        """Return a replica, or the primary when pinned or no replica is configured."""
+        replicas = self._replicas()
+        if _use_primary.get() or not replicas or model._meta.label_lower in CREDENTIAL_MODELS:
+            return PRIMARY_DB
+        request = _current_request.get()
+        if request is None:
+            return random.choice(replicas)
+        if is_pinned(request):
+            return PRIMARY_DB
+        return get_replica(request, replicas)
+
+    def db_for_write(self, model, **hints):
+        """Return the primary database."""
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between objects from the primary and its replicas."""
+        databases = {PRIMARY_DB, *self._replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class PrimaryPinningMiddleware:
+    """
+    Pin requests to the primary database for read-your-writes consistency.
+
+    Requests with unsafe methods (POST, PUT, PATCH, DELETE) read from the
+    primary, since they write. After a successful one, the user's requests
+    keep reading from the primary for REPLICA_PIN_SECONDS, which should exceed
+    the replication lag. The user is the one the request authenticated as or,
+    for a login or registration, the owner of the token in the response. The
+    pin is kept in the cache, which must be shared between worker processes
+    (e.g. Redis or Memcached) for the pin to hold across them.
+    """
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _get_user_id(self, request, response):
+        """Return the id of the user a successful write was made for, if any."""
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return user.pk
+        data = getattr(response, "data", None)
+        if isinstance(data, dict) and isinstance(data.get("token"), str):
+            return Token.objects.filter(key=data["token"]).values_list("user_id", flat=True).first()
+        return None
+
+    def __call__(self, request):
+        if request.method in self.SAFE_METHODS:
+            token = _current_request.set(request)
+            try:
+                return self.get_response(request)
+            finally:
+                _current_request.reset(token)
+
+        with use_primary():
+            response = self.get_response(request)
+            if response.status_code < 400:
+                user_id = self._get_user_id(request, response)
+                if user_id is not None:
+                    cache.set(pin_key(user_id), True, getattr(settings, "REPLICA_PIN_SECONDS", 5))
+        return response
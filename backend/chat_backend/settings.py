@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "chat.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -62,6 +64,11 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# Conversation list revalidation (ETag / If-None-Match)
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+
+CORS_EXPOSE_HEADERS = ["ETag", "X-Total-Count"]
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -69,9 +76,19 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # ORJSONRenderer falls back to DRF's JSONRenderer when orjson is not installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'chat.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Response compression (Brotli when the client accepts it and brotli is installed, else gzip)
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 4
+
 ROOT_URLCONF = "chat_backend.urls"
 
 TEMPLATES = [
@@ -144,3 +161,121 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# LLM providers
+# A `model` value of the form "<provider>:<model>" is served by that provider;
+# any other value is a deployment of LLM_DEFAULT_PROVIDER.
+
+LLM_DEFAULT_PROVIDER = "azure"
+
+LLM_PROVIDERS = {
+    "azure": {
+        # Credentials default to the AZURE_OPENAI_* environment variables
+        "BACKEND": "chat.services.providers.azure.AzureOpenAIProvider",
+    },
+    "openai": {
+        # Any OpenAI-compatible server (llama.cpp server, vLLM, Ollama, ...)
+        "BACKEND": "chat.services.providers.openai_compatible.OpenAICompatibleProvider",
+        "OPTIONS": {
+            "base_url": os.environ.get("OPENAI_COMPATIBLE_BASE_URL", "http://localhost:8080/v1/"),
+            "api_key": os.environ.get("OPENAI_COMPATIBLE_API_KEY"),
+        },
+    },
+    "local": {
+        # In-process CPU models served from a worker process pool. GGUF models
+        # ("backend": "llama_cpp", "path": ...) need llama-cpp-python installed.
+        "BACKEND": "chat.services.providers.local.LocalCPUProvider",
+        "OPTIONS": {
+            "workers": int(os.environ.get("LOCAL_LLM_WORKERS", "1")),
+            "models": {
+                "echo": {"backend": "echo"},
+            },
+        },
+    },
+}
+
+if os.environ.get("LOCAL_LLM_MODEL_PATH"):
+    LLM_PROVIDERS["local"]["OPTIONS"]["models"]["default"] = {
+        "backend": "llama_cpp",
+        "path": os.environ["LOCAL_LLM_MODEL_PATH"],
+    }
+
+# Aliases for `model` values, e.g. {"small": "local:default"}
+LLM_MODEL_ROUTES = {}
+
+
+# Largest max_tokens a prompt profile may set; keep it within what the deployments
+# accept and well below the USAGE_QUOTAS token limits
+PROMPT_MAX_TOKENS_LIMIT = int(os.environ.get("PROMPT_MAX_TOKENS_LIMIT", 4096))
+
+
+# Conversation title generation
+# Titles are generated off the request path, either with the local heuristic in
+# Conversation.generate_title or with one short LLM call per batch of conversations.
+
+TITLE_GENERATION_USE_LLM = os.environ.get("TITLE_GENERATION_USE_LLM", "false").lower() == "true"
+
+TITLE_GENERATION_MODEL = os.environ.get("TITLE_GENERATION_MODEL", "gpt-4o-mini")
+
+# Run generation in a background thread after the first exchange. When disabled,
+# run `python manage.py generate_titles` periodically instead.
+TITLE_GENERATION_BACKGROUND = True
+
+# Seconds to wait before a background run, so concurrent first exchanges share a batch
+TITLE_GENERATION_DELAY = 2.0
+
+TITLE_GENERATION_BATCH_SIZE = 20
+
+
+# Usage quotas and generation scheduling
+# Quotas are counted per fixed window of `window` seconds in the UsageCounter
+# table, so they hold across all worker processes. "default" applies to all
+# of a user's generations, "models" adds limits for single `model` values.
+# A limit of None is unlimited. Run `python manage.py purge_usage_counters`
+# periodically to delete old windows.
+
+USAGE_QUOTAS = {
+    "default": {
+        "requests": int(os.environ.get("USAGE_QUOTA_REQUESTS", 100)),
+        "tokens": int(os.environ.get("USAGE_QUOTA_TOKENS", 200000)),
+        "window": 3600,
+    },
+    "models": {},
+}
+
+# Generations running at once per worker process; queued generations are
+# served across users by weighted round-robin, staff with `staff_weight`.
+# The scheduler is per process, so fair sharing only applies within a worker
+# that serves several requests at once (threaded or ASGI workers). With sync
+# workers that handle one request each, no queue ever forms: capacity is the
+# number of workers, and only USAGE_QUOTAS limit each user's share.
+GENERATION_SCHEDULER = {
+    "capacity": int(os.environ.get("GENERATION_CAPACITY", 4)),
+    "timeout": 60,
+    "staff_weight": 2,
+}
+
+# Maximum number of models in one multi-model (fan-out) add_message turn
+FAN_OUT_MAX_MODELS = 4
+
+# Seconds a conversation history prepared by the typing action stays cached
+PREPARED_PROMPT_TIMEOUT = 60
+
+
+# Message content compression
+# When enabled, message content of at least `min_size` characters is stored
+# zstd-compressed (zlib if zstandard is not installed) in the binary
+# Message.content_compressed column, optionally with a dictionary trained
+# by `python manage.py compress_messages --train-dictionary`.
+# Keep dictionaries that existing rows were compressed with in `dictionaries`.
+# Existing rows are converted with `python manage.py compress_messages`.
+# Compressed rows are not matched by content searches (admin, full-text index).
+
+MESSAGE_COMPRESSION = {
+    "enabled": os.environ.get("MESSAGE_COMPRESSION", "false").lower() == "true",
+    "min_size": 512,
+    "level": 3,
+    "dictionary": os.environ.get("MESSAGE_COMPRESSION_DICTIONARY") or None,
+    "dictionaries": [],
+}
@@ -0,0 +1,48 @@
+"""
+Settings profile with read replicas.
+
+Writes and all reads of write requests go to the "default" (primary)
+database; reads of other requests go to the replicas, except for a client
+that wrote within the last REPLICA_PIN_SECONDS. Use it with
+DJANGO_SETTINGS_MODULE=chat_backend.settings_replica.
+
+Replicas are SQLite files listed in DATABASE_REPLICA_NAMES (comma separated),
+by default a single db.replica.sqlite3 next to the primary. A copy of the
+primary database stands in for a lagging replica; refresh it with
+`cp db.sqlite3 db.replica.sqlite3` to "replicate". PostgreSQL replicas are
+configured the same way, with the replica's HOST in each entry.
+
+Tests get a separate test database per replica, so routing is observable:
+run the suite with `DJANGO_SETTINGS_MODULE=chat_backend.settings_replica
+python manage.py test`. The chat tests read from the primary; routing is
+tested in chat_backend.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, MIDDLEWARE
+
+replica_names = [
+    name.strip()
+    for name in os.environ.get("DATABASE_REPLICA_NAMES", str(BASE_DIR / "db.replica.sqlite3")).split(",")
+    if name.strip()
+]
+
+DATABASE_REPLICAS = [f"replica{i}" if i else "replica" for i in range(len(replica_names))]
+
+for alias, name in zip(DATABASE_REPLICAS, replica_names):
+    DATABASES[alias] = {**DATABASES["default"], "NAME": name}
+
+DATABASE_ROUTERS = ["chat_backend.db_router.PrimaryReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after a write; keep it above the replication lag.
+# The pin is stored in the cache, so configure a cache shared by all workers (the default is per process).
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# Pin before any middleware that reads the database (sessions, authentication)
+MIDDLEWARE = list(MIDDLEWARE)
+MIDDLEWARE.insert(
+    MIDDLEWARE.index("django.contrib.sessions.middleware.SessionMiddleware"),
+    "chat_backend.db_router.PrimaryPinningMiddleware",
+)
@@ -0,0 +1,112 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from chat.models import Conversation
+
+from .db_router import PRIMARY_DB, PrimaryReplicaRouter, _current_request, use_primary
+
+REPLICA_CONFIGURED = "replica" in settings.DATABASES
+
+
+@skipUnless(
+    REPLICA_CONFIGURED,
+    "Run with DJANGO_SETTINGS_MODULE=chat_backend.settings_replica to test read replicas",
+)
+@override_settings(TITLE_GENERATION_BACKGROUND=False, REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTests(TestCase):
+    """
+    Tests for routing reads to replicas with read-your-writes pinning.
+
+    The replica test database is never written to, so it stands in for a
+    replica that has not caught up with anything yet.
+    """
+
+    databases = {"default", "replica"} if REPLICA_CONFIGURED else {"default"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="password")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Conversation), "replica")
+        self.assertEqual(router.db_for_read(Token), PRIMARY_DB)
+        self.assertEqual(router.db_for_write(Conversation), PRIMARY_DB)
+        with use_primary():
+            self.assertEqual(router.db_for_read(Conversation), PRIMARY_DB)
+
+    def test_each_request_reads_from_one_replica(self):
+        router = PrimaryReplicaRouter()
+        requests = [HttpRequest(), HttpRequest()]
+        with mock.patch.object(PrimaryReplicaRouter, "_replicas", return_value=["replica", "replica1"]), \
+                mock.patch("chat_backend.db_router.random.choice", side_effect=["replica1", "replica"]):
+            for request, replica in zip(requests, ["replica1", "replica"]):
+                token = _current_request.set(request)
+                try:
+                    self.assertEqual([router.db_for_read(Conversation) for _ in range(3)], [replica] * 3)
+                finally:
+                    _current_request.reset(token)
+
+    def test_safe_requests_read_from_the_replica(self):
+        conversation = Conversation.objects.create(user=self.user, title="Written")
+
+        response = self.client.get(f"/api/conversations/{conversation.pk}/")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_unsafe_requests_read_from_the_primary(self):
+        conversation = Conversation.objects.create(user=self.user, title="Written")
+
+        response = self.client.patch(
+            f"/api/conversations/{conversation.pk}/", {"title": "Renamed"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_pin_the_user_for_the_pin_window(self):
+        response = self.client.post("/api/conversations/", {"title": "Written"}, format="json")
+        conversation_id = response.data["id"]
+
+        self.assertEqual(self.client.get(f"/api/conversations/{conversation_id}/").status_code, 200)
+
+        cache.clear()
+        self.assertEqual(self.client.get(f"/api/conversations/{conversation_id}/").status_code, 404)
+
+    def test_failed_writes_do_not_pin(self):
+        self.client.post("/api/prompt-profiles/", {"name": "Broken", "stop": "not a list"}, format="json")
+
+        self.assertIsNone(cache.get(f"primary-pin:{self.user.pk}"))
+
+    def test_login_then_read(self):
+        Conversation.objects.create(user=self.user, title="Written")
+        client = APIClient()
+
+        response = client.post("/api/auth/login/", {"username": "alice", "password": "password"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+        self.assertEqual(client.get("/api/users/me/").status_code, 200)
+        self.assertEqual(len(client.get("/api/conversations/").data), 1)
+
+    def test_register_then_read(self):
+        client = APIClient()
+
+        response = client.post(
+            "/api/auth/register/",
+            {"username": "bob", "password": "password", "email": "bob@example.com"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+
+        self.assertEqual(client.get("/api/users/me/").status_code, 200)
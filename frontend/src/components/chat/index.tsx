@@ -11,6 +11,7 @@ import MessageList from '../messages/MessageList';
 import useAuth from './hooks/useAuth';
 import useConversations from './hooks/useConversations';
 import useMessages from './hooks/useMessages';
+import apiService from '@/services/apiService';
 import { ChatSettings } from './types';
 
 const Chat = () => {
@@ -79,6 +80,14 @@ const Chat = () => {
     }
   }, [currentConversation, setMessagesFromConversation]);
 
+  // Let the backend prepare the next turn as soon as the user starts typing
+  const isTyping = input.trim().length > 0;
+  useEffect(() => {
+    if (isTyping && currentConversation) {
+      apiService.notifyTyping(currentConversation.id, settings.model).catch(() => {});
+    }
+  }, [isTyping, currentConversation, settings.model]);
+
   // Handle conversation selection
   const handleSelectConversation = useCallback(async (id: string) => {
     const conversation = await selectConversation(id);
@@ -1,5 +1,7 @@
 export interface Message {
     id?: string;
+    parent?: string | null;
+    siblings?: string[];
     role: string;
     content: string;
     created_at?: string;
@@ -12,8 +14,11 @@ export interface Conversation {
     temperature: number;
     context_length: number;
     prompt?: string;
+    prompt_profile?: number | null;
     created_at?: string;
     updated_at?: string;
+    last_message_preview?: string;
+    message_count?: number;
     messages?: Message[];
 }
 
@@ -15,6 +15,12 @@ const API_CONVERSATIONS_URL = `${API_BASE_URL}/conversations/`;
  */
 const API_AUTH_URL = `${API_BASE_URL}/auth/`;
 
+/**
+ * Last conversation list received from the backend and its ETag, so an
+ * unchanged sidebar can be revalidated with If-None-Match (304 Not Modified).
+ */
+let conversationListCache: { etag: string; data: any } | null = null;
+
 /**
  * API service for handling all HTTP requests to the backend.
  *
@@ -30,6 +36,7 @@ const apiService = {
    */
   setAuthToken: (token: string) => {
     axios.defaults.headers.common["Authorization"] = `Token ${token}`;
+    conversationListCache = null;
   },
 
   /**
@@ -76,10 +83,24 @@ const apiService = {
   /**
    * Get all conversations for the authenticated user.
    *
+   * The previous list is revalidated with its ETag, so an unchanged
+   * sidebar costs a 304 response without a body.
+   *
    * @returns {Promise<any>} The response data containing the list of conversations
    */
   getConversations: async () => {
-    const response = await axios.get(API_CONVERSATIONS_URL);
+    const response = await axios.get(API_CONVERSATIONS_URL, {
+      headers: conversationListCache
+        ? { "If-None-Match": conversationListCache.etag }
+        : {},
+      validateStatus: (status) =>
+        (status >= 200 && status < 300) || status === 304,
+    });
+    if (response.status === 304 && conversationListCache) {
+      return conversationListCache.data;
+    }
+    const etag = response.headers["etag"];
+    conversationListCache = etag ? { etag, data: response.data } : null;
     return response.data;
   },
 
@@ -146,13 +167,16 @@ const apiService = {
    * @param {string} message - The message content
    * @param {string} model - The AI model to use
    * @param {number} temperature - The temperature setting for generation
+   * @param {Array<{model: string, temperature?: number}>} [models] - Models to compare;
+   *   each answers concurrently and is returned in `assistant_messages`
    * @returns {Promise<any>} The response data containing both user and AI messages
    */
   addMessage: async (
     conversationId: string,
     message: string,
     model: string,
-    temperature: number
+    temperature: number,
+    models?: { model: string; temperature?: number }[]
   ) => {
     const response = await axios.post(
       `${API_CONVERSATIONS_URL}${conversationId}/add_message/`,
@@ -161,10 +185,68 @@ const apiService = {
         content: message,
         model: model,
         temperature: temperature,
+        ...(models ? { models } : {}),
       }
     );
     return response.data;
   },
+
+  /**
+   * Generate a new answer as a sibling branch of an assistant message.
+   *
+   * @param {string} conversationId - The conversation ID
+   * @param {string} [messageId] - The assistant message to regenerate (defaults to the active one)
+   * @returns {Promise<any>} The response data containing the new AI message
+   */
+  regenerateMessage: async (conversationId: string, messageId?: string) => {
+    const response = await axios.post(
+      `${API_CONVERSATIONS_URL}${conversationId}/regenerate/`,
+      messageId ? { message_id: messageId } : {}
+    );
+    return response.data;
+  },
+
+  /**
+   * Edit a user message, creating a new branch with a fresh AI response.
+   *
+   * @param {string} conversationId - The conversation ID
+   * @param {string} messageId - The user message to edit
+   * @param {string} content - The new message content
+   * @returns {Promise<any>} The response data containing both user and AI messages
+   */
+  editMessage: async (conversationId: string, messageId: string, content: string) => {
+    const response = await axios.post(
+      `${API_CONVERSATIONS_URL}${conversationId}/edit_message/`,
+      { message_id: messageId, content }
+    );
+    return response.data;
+  },
+
+  /**
+   * Tell the backend the user started typing, so it can prepare the next turn.
+   *
+   * @param {string} conversationId - The conversation ID
+   * @param {string} model - The AI model the next message will use
+   * @returns {Promise<void>}
+   */
+  notifyTyping: async (conversationId: string, model: string) => {
+    await axios.post(`${API_CONVERSATIONS_URL}${conversationId}/typing/`, { model });
+  },
+
+  /**
+   * Make the branch through a message the active one.
+   *
+   * @param {string} conversationId - The conversation ID
+   * @param {string} messageId - Any message on the branch to switch to
+   * @returns {Promise<any>} The response data containing the updated conversation
+   */
+  switchBranch: async (conversationId: string, messageId: string) => {
+    const response = await axios.post(
+      `${API_CONVERSATIONS_URL}${conversationId}/switch_branch/`,
+      { message_id: messageId }
+    );
+    return response.data;
+  },
 };
 
 export default apiService;